@@ -0,0 +1,196 @@
+# album_summary.py
+import io
+import json
+import asyncio
+import weakref
+import hashlib
+import datetime
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from r2_storage import upload_bytes_to_r2, list_object_details, get_object_bytes, get_object_url, delete_from_r2
+
+# Summaries and cover thumbnails live next to the photos; dot-prefixed names
+# are never listed as photos.
+SUMMARY_NAME = ".summary.json"
+THUMBNAIL_PREFIX = ".cover_"  # Followed by a hash of the cover's key, so CDN caches never go stale
+THUMBNAIL_SIZE = (480, 360)
+SUMMARY_FETCH_CONCURRENCY = 16  # Albums fetched in parallel on the dashboard
+# Summaries are refreshed after each batch through the gateway; this bounds how
+# long one can miss changes made elsewhere (a failed refresh, a direct upload).
+SUMMARY_MAX_AGE = datetime.timedelta(minutes=10)
+COVER_CANDIDATES = 5  # Most confident faces kept, so a deleted cover falls back to the next best
+
+# Serializes read-modify-write of each album's summary within this process;
+# a lock is dropped once no update is using it. Across processes, updates
+# recompute from a full listing, so the last writer still stores a complete count.
+_album_locks = weakref.WeakValueDictionary()
+
+
+def is_photo_key(object_key):
+    """True for photo objects; False for folders, placeholders and summary files."""
+    name = object_key.rsplit('/', 1)[-1]
+    return bool(name) and not name.startswith('.')
+
+
+def _album_prefix(username, album_id):
+    return f"{username}/{album_id}/"
+
+
+def _lock_for(username, album_id):
+    lock = _album_locks.get((username, album_id))
+    if lock is None:
+        lock = _album_locks[(username, album_id)] = asyncio.Lock()
+    return lock
+
+
+def _make_thumbnail(image_bytes):
+    """Return JPEG bytes of a small, upright version of a photo."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft('RGB', THUMBNAIL_SIZE)
+    ImageOps.exif_transpose(image, in_place=True)
+    image = image.convert('RGB')
+    image.thumbnail(THUMBNAIL_SIZE)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+async def _set_cover(summary, username, album_id, object_key, confidence=None):
+    """Make `object_key` the album cover and upload its thumbnail."""
+    previous_thumbnail = summary.get('cover_thumbnail_key')
+    thumbnail_key = None
+    image_bytes = await get_object_bytes(object_key)
+    if image_bytes is not None:
+        try:
+            thumbnail = await run_in_threadpool(_make_thumbnail, image_bytes)
+            digest = hashlib.sha1(object_key.encode()).hexdigest()[:12]
+            thumbnail_key = f"{_album_prefix(username, album_id)}{THUMBNAIL_PREFIX}{digest}.jpg"
+            uploaded, _ = await upload_bytes_to_r2(thumbnail, thumbnail_key, 'image/jpeg')
+            if not uploaded:
+                thumbnail_key = None
+        except Exception as e:
+            print(f"Cover thumbnail failed for {object_key}: {e}")
+            thumbnail_key = None
+    summary.update(cover_key=object_key, cover_confidence=confidence, cover_thumbnail_key=thumbnail_key)
+    if previous_thumbnail and previous_thumbnail != thumbnail_key:
+        await delete_from_r2(previous_thumbnail)
+
+
+async def _load(username, album_id):
+    data = await get_object_bytes(_album_prefix(username, album_id) + SUMMARY_NAME)
+    if data is None:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+async def _save(username, album_id, summary):
+    summary['updated_at'] = datetime.datetime.utcnow().isoformat() + 'Z'
+    await upload_bytes_to_r2(json.dumps(summary).encode(), _album_prefix(username, album_id) + SUMMARY_NAME, 'application/json')
+
+
+def _is_stale(summary):
+    try:
+        updated_at = datetime.datetime.fromisoformat(summary['updated_at'].rstrip('Z'))
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.datetime.utcnow() - updated_at > SUMMARY_MAX_AGE
+
+
+def _rank_candidates(previous_candidates, faces, photo_keys):
+    """Merge cover candidates, best first, keeping only photos that still exist."""
+    confidences = {face['key']: face['confidence'] for face in previous_candidates}
+    confidences.update((face['key'], face['confidence']) for face in faces)
+    ranked = sorted((key for key in confidences if key in photo_keys), key=confidences.get, reverse=True)
+    return [{"key": key, "confidence": confidences[key]} for key in ranked[:COVER_CANDIDATES]]
+
+
+async def _compute(username, album_id, previous=None, faces=()):
+    """Build a summary from a full listing of the album.
+
+    The cover is the most confident face among the candidates whose photo
+    still exists. Albums without detected faces keep their previous cover
+    while it exists, and otherwise use their first photo.
+    """
+    previous = previous or {}
+    photos = [obj for obj in await list_object_details(_album_prefix(username, album_id)) if is_photo_key(obj['key'])]
+    photo_keys = {obj['key'] for obj in photos}
+    candidates = _rank_candidates(previous.get('cover_candidates', []), faces, photo_keys)
+    summary = {
+        "photo_count": len(photos),
+        "total_bytes": sum(obj['size'] for obj in photos),
+        "cover_candidates": candidates,
+        # Let _set_cover replace the old thumbnail, or drop it if the album is empty
+        "cover_key": previous.get('cover_key'),
+        "cover_confidence": previous.get('cover_confidence'),
+        "cover_thumbnail_key": previous.get('cover_thumbnail_key'),
+    }
+
+    if candidates:
+        cover_key, confidence = candidates[0]['key'], candidates[0]['confidence']
+    elif summary['cover_key'] in photo_keys:
+        cover_key, confidence = summary['cover_key'], summary['cover_confidence']
+    elif photos:
+        cover_key, confidence = photos[0]['key'], None
+    else:
+        if summary['cover_thumbnail_key']:
+            await delete_from_r2(summary['cover_thumbnail_key'])
+        summary.update(cover_key=None, cover_confidence=None, cover_thumbnail_key=None)
+        return summary
+
+    if cover_key != summary['cover_key']:
+        await _set_cover(summary, username, album_id, cover_key, confidence)
+    summary['cover_confidence'] = confidence
+    return summary
+
+
+async def get_summary(username, album_id):
+    """Return the album's summary, recomputing it if missing or older than SUMMARY_MAX_AGE."""
+    summary = await _load(username, album_id)
+    if summary is not None and not _is_stale(summary):
+        return summary
+    async with _lock_for(username, album_id):
+        # Another request may have refreshed it while this one waited for the lock
+        summary = await _load(username, album_id)
+        if summary is not None and not _is_stale(summary):
+            return summary
+        summary = await _compute(username, album_id, previous=summary)
+        await _save(username, album_id, summary)
+        return summary
+
+
+async def get_summaries(username, album_ids):
+    """Fetch summaries for several albums concurrently, in the given order."""
+    semaphore = asyncio.Semaphore(SUMMARY_FETCH_CONCURRENCY)
+
+    async def fetch(album_id):
+        async with semaphore:
+            return await get_summary(username, album_id)
+
+    return await asyncio.gather(*(fetch(album_id) for album_id in album_ids))
+
+
+async def refresh_summary(username, album_id, best_faces=()):
+    """Recount an album after a batch of uploads or deletions.
+
+    `best_faces` ({"key", "confidence"} dicts from indexing) are added to
+    the album's cover candidates.
+    """
+    async with _lock_for(username, album_id):
+        summary = await _compute(username, album_id, previous=await _load(username, album_id), faces=best_faces)
+        await _save(username, album_id, summary)
+
+
+def format_album(album_id, summary):
+    """Shape a summary as an entry of the /api/albums response."""
+    cover_key = summary.get('cover_thumbnail_key') or summary.get('cover_key')
+    return {
+        "id": album_id,
+        "name": album_id.replace('-', ' ').title(),
+        "cover": get_object_url(cover_key) if cover_key else None,
+        "photo_count": summary.get('photo_count', 0),
+        "total_bytes": summary.get('total_bytes', 0),
+    }
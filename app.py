@@ -1,238 +1,424 @@
 # app.py
 import os
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-from werkzeug.utils import secure_filename
+import math
+import time
+import asyncio
 import uuid
-import requests
-import datetime
+import httpx
+from collections import Counter
+import uvicorn
+from fastapi import FastAPI, Request, Response, Depends
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import UploadFile
+from werkzeug.utils import secure_filename
 
 # Import our custom modules
-from config import ML_API_BASE_URL
-from r2_storage import upload_to_r2, list_objects, get_object_url, delete_from_r2
-from auth import create_token, verify_token, authenticate_user, PASSWORD_DB
+from config import (
+    ML_API_BASE_URL, ML_API_KEY, SEARCH_RATE_LIMIT_PER_TOKEN, SEARCH_RATE_LIMIT_PER_ALBUM,
+    ML_MAX_IN_FLIGHT, ML_MAX_QUEUED, ML_QUEUE_TIMEOUT,
+)
+import r2_storage
+from r2_storage import upload_bytes_to_r2, list_objects, get_object_url, delete_from_r2
+from auth import create_token, verify_token, revoke_token, authenticate_user, verify_album_password
+from album_summary import is_photo_key, get_summaries, refresh_summary, format_album
+from rate_limit import RateLimited, Overloaded, ConcurrencyLimiter, check_rate_limit
+from metrics import (
+    timed, start_request_timing, get_request_timings, format_server_timing, render_metrics,
+    REQUEST_LATENCY, REQUESTS_IN_FLIGHT, ML_API_LATENCY, TIMING_REQUEST_HEADER,
+)
 
-app = Flask(__name__, static_folder='frontend')
-CORS(app)
+app = FastAPI(title="PixelPerfect API Gateway")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 # --- Configuration ---
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+ML_API_TIMEOUT = 60  # seconds
+ML_INDEXING_TIMEOUT = 600  # seconds; indexing a large upload batch runs face detection on every photo
+
+# Shared non-blocking client for calls to the ML API, opened at startup
+ml_client = None
+# Bounds how many face searches the CPU-bound ML API is asked to run at once.
+# Created at startup: on Python <= 3.9 its semaphore binds to the current event loop.
+ml_search_limiter = None
 
 def allowed_file(filename):
     """Checks if the file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# This function is no longer called directly from an endpoint,
-# but can be kept as a helper if needed elsewhere, though it is now unused.
-def trigger_batch_embedding(image_urls, album_id):
-    # ... (code for this function remains the same, but it's not used by any endpoint now)
-    pass
+class AuthenticationError(Exception):
+    """Raised by require_auth when the bearer token is missing or invalid."""
+
+def bearer_token(request: Request):
+    """Returns the token from the Authorization header, or '' if absent."""
+    return request.headers.get('Authorization', '').replace('Bearer ', '')
+
+async def require_auth(request: Request):
+    """Route dependency returning the verified token claims.
+
+    Async so FastAPI calls it on the event loop; verify_token is usually a
+    cache lookup, cheaper than the threadpool hop a sync dependency gets.
+    """
+    try:
+        return verify_token(bearer_token(request))
+    except Exception as e:
+        raise AuthenticationError(str(e))
+
+class AlbumAccessDenied(Exception):
+    """Raised by authorize_album when the token does not grant the album."""
+
+async def authorize_album(claims, album_id):
+    """Checks that the token may read `album_id`.
+
+    Guest tokens are issued for one album (`guest-<album_id>`); owner tokens
+    grant albums stored under the owner's own prefix.
+    """
+    subject = claims['sub']
+    if subject.startswith('guest-'):
+        allowed = subject == f"guest-{album_id}"
+    else:
+        allowed = bool(album_id) and bool(await list_objects(f"{subject}/{album_id}/", limit=1))
+    if not allowed:
+        raise AlbumAccessDenied(f"No access to album '{album_id}'")
+
+def owner_photo_prefix(claims, album_id):
+    """URL prefix of the owner's photos in an album, or None for guest tokens."""
+    if claims['sub'].startswith('guest-'):
+        return None
+    return get_object_url(f"{claims['sub']}/{album_id}/")
 
-def trigger_embedding_removal(album_id, image_url):
-    """Calls the ML API to remove an embedding for a deleted photo."""
+def scope_album_result(result, url_prefix):
+    """Drops photos outside `url_prefix` from an ML API album result.
+
+    Embedding files are named after the album id alone, so owners with
+    same-named albums share one; their results are narrowed to their own photos.
+    """
+    if url_prefix is None or not isinstance(result, dict):
+        return result
+    if 'matches' in result:
+        result['matches'] = [match for match in result['matches'] if match['url'].startswith(url_prefix)]
+        result['match_count'] = len(result['matches'])
+        if 'people' in result:
+            counts = Counter(match.get('person') for match in result['matches'])
+            result['people'] = [dict(person, photo_count=counts[person['person']])
+                                for person in result['people'] if counts[person['person']]]
+    elif 'people' in result:
+        people = []
+        for person in result['people']:
+            photos = [url for url in person['photos'] if url.startswith(url_prefix)]
+            if photos:
+                people.append(dict(person, photos=photos, cover=photos[0], photo_count=len(photos)))
+        result['people'] = people
+    return result
+
+@app.exception_handler(AuthenticationError)
+async def authentication_failed(request: Request, exc: AuthenticationError):
+    return JSONResponse({"error": "Authentication failed", "details": str(exc)}, status_code=401)
+
+@app.exception_handler(AlbumAccessDenied)
+async def album_access_denied(request: Request, exc: AlbumAccessDenied):
+    return JSONResponse({"error": "Access denied", "details": str(exc)}, status_code=403)
+
+@app.exception_handler(RateLimited)
+async def rate_limited(request: Request, exc: RateLimited):
+    return JSONResponse({"error": "Too many requests", "details": str(exc)}, status_code=429,
+                        headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    return JSONResponse({"error": "Service busy", "details": str(exc)}, status_code=503,
+                        headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
+async def read_json(request: Request):
+    """Returns the parsed JSON body, or None if it is missing or malformed."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+async def trigger_embedding_removal(album_id, object_keys):
+    """Calls the ML API once to remove the embeddings of deleted photos.
+
+    The ML API rewrites the album's embeddings file on every call, so all of
+    a request's deletions go in one call rather than one per photo.
+    """
     embedding_filename = f"{album_id}_embeddings.json"
     api_endpoint = f"{ML_API_BASE_URL}/remove_embedding/"
     try:
-        payload = {'image_url': image_url, 'embedding_file': embedding_filename}
-        response = requests.post(api_endpoint, data=payload, timeout=60)
+        payload = {'object_keys': object_keys, 'embedding_file': embedding_filename}
+        with timed(ML_API_LATENCY, "ml_remove_embedding", endpoint="remove_embedding"):
+            response = await ml_client.post(api_endpoint, data=payload)
         return response.status_code == 200, response.json()
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError: a non-JSON error body, e.g. a plain-text 500
         print(f"ML API remove embedding request failed: {e}")
         return False, {"error": "API request to remove embedding failed.", "details": str(e)}
 
-# --- Static File Serving ---
-@app.route('/')
-def index():
-    return send_from_directory('frontend', 'index.html')
+# --- Lifecycle ---
+@app.on_event("startup")
+async def open_clients():
+    """Open the shared storage and ML API clients."""
+    global ml_client, ml_search_limiter
+    await r2_storage.init_client()
+    # The key lets the ML API tell gateway calls apart from direct ones
+    ml_client = httpx.AsyncClient(timeout=ML_API_TIMEOUT, headers={"X-ML-API-Key": ML_API_KEY} if ML_API_KEY else None)
+    ml_search_limiter = ConcurrencyLimiter(ML_MAX_IN_FLIGHT, ML_MAX_QUEUED, ML_QUEUE_TIMEOUT)
+
+@app.on_event("shutdown")
+async def close_clients():
+    await r2_storage.close_client()
+    if ml_client is not None:
+        await ml_client.aclose()
+
+# --- Request Instrumentation ---
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Record request latency and optionally return the per-stage breakdown."""
+    start = time.perf_counter()
+    start_request_timing()
+    REQUESTS_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if request.headers.get(TIMING_REQUEST_HEADER):
+            timings = get_request_timings() + [("total", time.perf_counter() - start)]
+            response.headers['Server-Timing'] = format_server_timing(timings)
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            endpoint=getattr(route, "path", None) or "unmatched",
+            status=status,
+        ).observe(time.perf_counter() - start)
 
-@app.route('/<path:path>')
-def serve_static(path):
-    return send_from_directory('frontend', path)
+@app.get('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 # --- API Endpoints ---
-@app.route('/api/auth/login', methods=['POST'])
-def login():
-    data = request.get_json()
+@app.post('/api/auth/login')
+async def login(request: Request):
+    data = await read_json(request) or {}
     username = data.get('username')
     password = data.get('password')
     if authenticate_user(username, password):
         token = create_token(username)
-        return jsonify({"token": token, "username": username})
-    return jsonify({"error": "Invalid credentials"}), 401
+        return {"token": token, "username": username}
+    return JSONResponse({"error": "Invalid credentials"}, status_code=401)
 
-@app.route('/api/auth/verify', methods=['GET'])
-def verify_auth_token():
-    # ... (This endpoint remains the same)
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+@app.get('/api/auth/verify')
+async def verify_auth_token(request: Request):
     try:
-        payload = verify_token(token)
-        return jsonify({"valid": True, "username": payload['sub']})
+        payload = verify_token(bearer_token(request))
+        return {"valid": True, "username": payload['sub']}
     except Exception as e:
-        return jsonify({"valid": False, "error": str(e)}), 401
+        return JSONResponse({"valid": False, "error": str(e)}, status_code=401)
 
+@app.post('/api/auth/logout')
+async def logout(claims: dict = Depends(require_auth)):
+    revoke_token(claims)
+    return {"message": "Logged out"}
 
-@app.route('/api/create-album', methods=['POST'])
-def create_album():
-    # ... (This endpoint remains the same)
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    try:
-        payload = verify_token(token)
-        username = payload['sub']
-    except Exception as e:
-        return jsonify({"error": "Authentication failed", "details": str(e)}), 401
-    data = request.get_json()
+
+@app.post('/api/create-album')
+async def create_album(request: Request, claims: dict = Depends(require_auth)):
+    username = claims['sub']
+    data = await read_json(request)
     if not data or 'name' not in data:
-        return jsonify({"error": "Missing album name"}), 400
+        return JSONResponse({"error": "Missing album name"}, status_code=400)
     album_display_name = data['name']
     album_id = secure_filename(album_display_name.lower().replace(' ', '-'))
-    if not album_id: return jsonify({"error": "Invalid album name"}), 400
+    if not album_id: return JSONResponse({"error": "Invalid album name"}, status_code=400)
     r2_placeholder_path = f"{username}/{album_id}/.placeholder"
-    temp_placeholder_file = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_.placeholder")
-    with open(temp_placeholder_file, 'w') as f: f.write('')
-    upload_success, _ = upload_to_r2(temp_placeholder_file, r2_placeholder_path)
-    os.remove(temp_placeholder_file)
+    upload_success, _ = await upload_bytes_to_r2(b'', r2_placeholder_path)
     if upload_success:
-        return jsonify({"message": "Album created successfully", "album": {"id": album_id, "name": album_display_name}}), 201
+        return JSONResponse({"message": "Album created successfully", "album": {"id": album_id, "name": album_display_name}}, status_code=201)
     else:
-        return jsonify({"error": "Failed to create album in storage"}), 500
+        return JSONResponse({"error": "Failed to create album in storage"}, status_code=500)
 
 
-### --- NEW ENDPOINT to handle a single file upload --- ###
-# The frontend will call this endpoint repeatedly for each file.
-@app.route('/api/upload-single-file', methods=['POST'])
-def upload_single_file_route():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    try:
-        username = verify_token(token)['sub']
-    except Exception as e:
-        return jsonify({"error": "Authentication failed", "details": str(e)}), 401
+# The frontend calls this endpoint repeatedly, once for each file.
+@app.post('/api/upload-single-file')
+async def upload_single_file_route(request: Request, claims: dict = Depends(require_auth)):
+    username = claims['sub']
+    form = await request.form()
+    file_to_upload = form.get('file')
+    if not isinstance(file_to_upload, UploadFile):
+        return JSONResponse({"error": "No file part"}, status_code=400)
 
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    
-    file_to_upload = request.files['file']
-    album_id = request.form.get('album')
+    album_id = form.get('album')
 
     if not album_id:
-        return jsonify({"error": "Album ID is missing"}), 400
+        return JSONResponse({"error": "Album ID is missing"}, status_code=400)
 
-    if file_to_upload and allowed_file(file_to_upload.filename):
+    if file_to_upload.filename and allowed_file(file_to_upload.filename):
         original_filename = secure_filename(file_to_upload.filename)
         unique_name = f"{uuid.uuid4()}_{original_filename}"
-        local_path = os.path.join(UPLOAD_FOLDER, unique_name)
-        file_to_upload.save(local_path)
 
         r2_path = f"{username}/{album_id}/{unique_name}"
-        upload_success, public_url = upload_to_r2(local_path, r2_path)
-        os.remove(local_path)
+        upload_success, public_url = await upload_bytes_to_r2(await file_to_upload.read(), r2_path)
 
         if upload_success:
-            return jsonify({"success": True, "name": original_filename, "url": public_url, "id": unique_name}), 200
+            return {"success": True, "name": original_filename, "url": public_url, "id": unique_name}
         else:
-            return jsonify({"success": False, "error": "Failed to upload to R2 storage."}), 500
+            return JSONResponse({"success": False, "error": "Failed to upload to R2 storage."}, status_code=500)
     else:
-        return jsonify({"success": False, "error": "File type not allowed or no file submitted."}), 400
-
+        return JSONResponse({"success": False, "error": "File type not allowed or no file submitted."}, status_code=400)
 
-# The old /api/upload endpoint is no longer needed as the logic is now split
-# between the frontend and the new /api/upload-single-file endpoint.
 
-@app.route('/api/albums', methods=['GET'])
-def get_albums():
-    # ... (This endpoint remains the same)
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+@app.get('/api/albums')
+async def get_albums(claims: dict = Depends(require_auth)):
+    username = claims['sub']
     try:
-        username = verify_token(token)['sub']
-        album_prefixes = list_objects(f"{username}/", delimiter="/")
-        formatted_albums = []
-        if album_prefixes:
-            for album_prefix in album_prefixes:
-                album_id = album_prefix.rstrip('/').split('/')[-1]
-                if not album_id: continue
-                all_files = list_objects(album_prefix)
-                actual_photos = [obj for obj in all_files if not obj.endswith('/') and not obj.endswith('.placeholder')]
-                photo_count = len(actual_photos)
-                cover_image_url = get_object_url(actual_photos[0]) if actual_photos else None
-                formatted_albums.append({"id": album_id, "name": album_id.replace('-', ' ').title(), "cover": cover_image_url, "photo_count": photo_count})
-        return jsonify(formatted_albums)
+        album_prefixes = await list_objects(f"{username}/", delimiter="/")
+        album_ids = [prefix.rstrip('/').split('/')[-1] for prefix in album_prefixes if prefix.endswith('/')]
+        album_ids = [album_id for album_id in album_ids if album_id]
+        # Summaries are refreshed after each upload batch and deletion; only albums without one are listed in full
+        summaries = await get_summaries(username, album_ids)
+        return [format_album(album_id, summary) for album_id, summary in zip(album_ids, summaries)]
     except Exception as e:
-        return jsonify({"error": "Could not retrieve albums.", "details": str(e)}), 500
+        return JSONResponse({"error": "Could not retrieve albums.", "details": str(e)}, status_code=500)
 
-@app.route('/api/albums/<album_id>', methods=['GET'])
-def get_album_photos(album_id):
-    # ... (This endpoint remains the same)
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+@app.get('/api/albums/{album_id}')
+async def get_album_photos(album_id: str, claims: dict = Depends(require_auth)):
+    username = claims['sub']
     try:
-        username = verify_token(token)['sub']
-        photo_keys = list_objects(f"{username}/{album_id}/")
-        photos = [{"id": key.split('/')[-1], "url": get_object_url(key), "name": key.split('/')[-1]} for key in photo_keys if not key.endswith('/') and not key.endswith('.placeholder')]
-        return jsonify(photos)
+        photo_keys = await list_objects(f"{username}/{album_id}/")
+        photos = [{"id": key.split('/')[-1], "url": get_object_url(key), "name": key.split('/')[-1]} for key in photo_keys if is_photo_key(key)]
+        return photos
     except Exception as e:
-        return jsonify({"error": "Could not retrieve album photos.", "details": str(e)}), 500
+        return JSONResponse({"error": "Could not retrieve album photos.", "details": str(e)}, status_code=500)
 
 
-@app.route('/api/albums/<album_id>/photos/delete', methods=['POST'])
-def delete_album_photos(album_id):
-    # ... (This endpoint remains the same)
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    try:
-        username = verify_token(token)['sub']
-    except Exception as e:
-        return jsonify({"error": "Authentication failed", "details": str(e)}), 401
-    data = request.get_json()
+@app.post('/api/albums/{album_id}/photos/delete')
+async def delete_album_photos(album_id: str, request: Request, claims: dict = Depends(require_auth)):
+    username = claims['sub']
+    data = await read_json(request)
     if not data or 'photo_ids' not in data:
-        return jsonify({"error": "Invalid request: 'photo_ids' list is required."}), 400
-    photo_ids_to_delete = data['photo_ids']
-    deleted_count, errors = 0, []
-    for photo_filename in photo_ids_to_delete:
+        return JSONResponse({"error": "Invalid request: 'photo_ids' list is required."}, status_code=400)
+
+    async def delete_photo(photo_filename):
         r2_object_key = f"{username}/{album_id}/{secure_filename(photo_filename)}"
-        public_url = get_object_url(r2_object_key)
-        success, error_msg = delete_from_r2(r2_object_key)
+        success, error_msg = await delete_from_r2(r2_object_key)
         if success:
-            deleted_count += 1
-            trigger_embedding_removal(album_id, public_url)
-        else:
-            errors.append({"photo_id": photo_filename, "error": error_msg or "Failed to delete from storage."})
+            return r2_object_key, None
+        return None, {"photo_id": photo_filename, "error": error_msg or "Failed to delete from storage."}
+
+    results = await asyncio.gather(*(delete_photo(photo_id) for photo_id in data['photo_ids']))
+    deleted_keys = [key for key, _ in results if key]
+    errors = [error for _, error in results if error]
+    deleted_count = len(deleted_keys)
+    if deleted_keys:
+        await trigger_embedding_removal(album_id, deleted_keys)
+    if deleted_count:
+        try:
+            await refresh_summary(username, album_id)
+        except Exception as e:
+            print(f"Album summary update failed for {album_id}: {e}")
     if errors:
-        return jsonify({"message": f"Deletion completed with {len(errors)} errors.", "deleted_count": deleted_count, "errors": errors}), 207
-    return jsonify({"message": f"Successfully deleted {deleted_count} photo(s)."}), 200
+        return JSONResponse({"message": f"Deletion completed with {len(errors)} errors.", "deleted_count": deleted_count, "errors": errors}, status_code=207)
+    return {"message": f"Successfully deleted {deleted_count} photo(s)."}
+
+
+@app.post('/api/albums/{album_id}/index')
+async def index_album_photos(album_id: str, request: Request, claims: dict = Depends(require_auth)):
+    """Runs face indexing for a batch of uploaded photos, then updates the album's summary.
 
+    The frontend calls this once after uploading a batch, so the summary is
+    recounted once per batch rather than on every upload.
+    """
+    username = claims['sub']
+    form = await request.form()
+    album_prefix = f"{username}/{album_id}/"
+    urls = [url for url in form.getlist('urls') if url.startswith(get_object_url(album_prefix))]
+    if not urls:
+        return JSONResponse({"error": "No photo URLs from this album were provided."}, status_code=400)
+    try:
+        data_payload = {"urls": urls, "embedding_file": f"{album_id}_embeddings.json"}
+        with timed(ML_API_LATENCY, "ml_add_embeddings", endpoint="add_embeddings_from_urls"):
+            response = await ml_client.post(f"{ML_API_BASE_URL}/add_embeddings_from_urls/", data=data_payload, timeout=ML_INDEXING_TIMEOUT)
+        result, status_code = response.json(), response.status_code
+    except Exception as e:
+        result, status_code = {"error": "Error processing faces.", "details": str(e)}, 500
 
-@app.route('/api/find-matches', methods=['POST'])
-def find_matches():
-    # ... (This endpoint remains the same)
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    # The photos are uploaded either way, so the summary is refreshed even if indexing failed
+    best_faces = result.get('best_faces', []) if status_code == 200 else []
+    best_faces = [face for face in best_faces if face['key'].startswith(album_prefix)]
     try:
-        verify_token(token)
+        await refresh_summary(username, album_id, best_faces)
     except Exception as e:
-        return jsonify({"error": "Authentication failed", "details": str(e)}), 401
-    if 'file' not in request.files or 'album' not in request.form:
-        return jsonify({"error": "Missing file or album ID"}), 400
-    file = request.files['file']
-    album_id = request.form['album']
+        print(f"Album summary update failed for {album_id}: {e}")
+    return JSONResponse(result, status_code=status_code)
+
+
+async def forward_face_search(request: Request, claims: dict, ml_path: str, metric_endpoint: str):
+    """Forwards an uploaded query face to an ML API search endpoint.
+
+    The token must grant the album (see authorize_album). Each search is
+    charged to both the caller's token and the album, and only
+    ML_MAX_IN_FLIGHT searches run on the ML API at once.
+    """
+    # Charged before the upload is read, so rejected callers cost no buffering
+    check_rate_limit("token", claims.get('jti') or claims['sub'], *SEARCH_RATE_LIMIT_PER_TOKEN)
+    form = await request.form()
+    file = form.get('file')
+    if not isinstance(file, UploadFile) or 'album' not in form:
+        return JSONResponse({"error": "Missing file or album ID"}, status_code=400)
+    album_id = form['album']
+    await authorize_album(claims, album_id)
+    check_rate_limit("album", album_id, *SEARCH_RATE_LIMIT_PER_ALBUM)
     embedding_file_name = f"{album_id}_embeddings.json"
     try:
-        api_endpoint = f"{ML_API_BASE_URL}/find_similar_faces/"
-        files_payload = {"file": (secure_filename(file.filename), file.read(), file.content_type)}
+        api_endpoint = f"{ML_API_BASE_URL}/{ml_path}/"
+        files_payload = {"file": (secure_filename(file.filename or ''), await file.read(), file.content_type)}
         data_payload = {"embedding_file": embedding_file_name}
-        response = requests.post(api_endpoint, files=files_payload, data=data_payload, timeout=60)
-        return jsonify(response.json()), response.status_code
+        async with ml_search_limiter.slot():
+            with timed(ML_API_LATENCY, f"ml_{metric_endpoint}", endpoint=metric_endpoint):
+                response = await ml_client.post(api_endpoint, files=files_payload, data=data_payload)
+        result = scope_album_result(response.json(), owner_photo_prefix(claims, album_id))
+        return JSONResponse(result, status_code=response.status_code)
+    except Overloaded:
+        raise
     except Exception as e:
-        return jsonify({"error": "Error finding matches.", "details": str(e)}), 500
+        return JSONResponse({"error": "Error finding matches.", "details": str(e)}, status_code=500)
+
+@app.post('/api/find-matches')
+async def find_matches(request: Request, claims: dict = Depends(require_auth)):
+    return await forward_face_search(request, claims, "find_similar_faces", "find_similar_faces")
+
+@app.post('/api/find-person')
+async def find_person(request: Request, claims: dict = Depends(require_auth)):
+    """Returns every photo of the people whose face matches the query."""
+    return await forward_face_search(request, claims, "find_person", "find_person")
 
-@app.route('/api/check-password/<album_id>', methods=['POST'])
-def check_album_password(album_id):
-    # ... (This endpoint remains the same)
-    data = request.get_json()
+@app.get('/api/albums/{album_id}/people')
+async def get_album_people(album_id: str, claims: dict = Depends(require_auth)):
+    await authorize_album(claims, album_id)
+    try:
+        with timed(ML_API_LATENCY, "ml_album_people", endpoint="album_people"):
+            response = await ml_client.post(f"{ML_API_BASE_URL}/album_people/", data={"embedding_file": f"{album_id}_embeddings.json"})
+        result = scope_album_result(response.json(), owner_photo_prefix(claims, album_id))
+        return JSONResponse(result, status_code=response.status_code)
+    except Exception as e:
+        return JSONResponse({"error": "Could not retrieve album people.", "details": str(e)}, status_code=500)
+
+@app.post('/api/check-password/{album_id}')
+async def check_album_password(album_id: str, request: Request):
+    data = await read_json(request) or {}
     password = data.get('password')
-    if album_id in PASSWORD_DB and PASSWORD_DB[album_id] == password:
+    if verify_album_password(album_id, password):
         guest_token = create_token(f"guest-{album_id}", expires_in=3600)
-        return jsonify({"valid": True, "token": guest_token})
-    return jsonify({"valid": False, "error": "Incorrect password"}), 401
+        return {"valid": True, "token": guest_token}
+    return JSONResponse({"valid": False, "error": "Incorrect password"}, status_code=401)
 
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get("PORT", 8000)))
+# --- Static File Serving ---
+# Mounted last so the API routes above take precedence; html=True serves index.html at '/'.
+app.mount('/', StaticFiles(directory='frontend', html=True), name='frontend')
 
+if __name__ == '__main__':
+    uvicorn.run("app:app", host='0.0.0.0', port=int(os.environ.get("PORT", 8000)), reload=True)
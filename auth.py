@@ -1,9 +1,66 @@
 # auth.py
 import jwt
+import hmac
+import time
 import datetime
+import threading
 import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from config import JWT_SECRET
 
+# Verified token claims, most recently used last: {token: payload}
+TOKEN_CACHE_SIZE = 4096
+_token_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class RevocationStore(ABC):
+    """Storage for revoked token ids.
+
+    Revocations must reach every gateway process: a token logged out on one
+    process is otherwise still accepted by the others until it expires. The
+    in-process store is only correct with a single gateway process; for more,
+    implement this with a shared store such as Redis (e.g. SET jti with an
+    expiry at `exp`) and pass it to configure_revocations().
+    """
+
+    @abstractmethod
+    def revoke(self, jti, exp):
+        """Reject the token id `jti` until the Unix time `exp`."""
+
+    @abstractmethod
+    def is_revoked(self, jti):
+        """Return True if the token id has been revoked."""
+
+
+class InMemoryRevocationStore(RevocationStore):
+    """Revoked token ids held in this process: {jti: exp}."""
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, exp):
+        now = time.time()
+        with self._lock:
+            # Forget revocations whose tokens have expired on their own
+            for expired in [j for j, e in self._revoked.items() if e <= now]:
+                del self._revoked[expired]
+            self._revoked[jti] = exp
+
+    def is_revoked(self, jti):
+        return jti in self._revoked
+
+
+_revocations = InMemoryRevocationStore()
+
+
+def configure_revocations(store):
+    """Use `store` for token revocations, e.g. a shared-store implementation."""
+    global _revocations
+    _revocations = store
+
 # Demo user database (in a real app, this would be a database)
 USER_DB = {
     "admin": "admin123",
@@ -20,11 +77,19 @@ PASSWORD_DB = {
     "graduation": "grad2023"
 }
 
+def _matches(expected, provided):
+    """Constant-time comparison of a stored secret with user input"""
+    if expected is None or not isinstance(provided, str):
+        return False
+    return hmac.compare_digest(expected.encode(), provided.encode())
+
 def authenticate_user(username, password):
     """Check if username and password are valid"""
-    if username in USER_DB and USER_DB[username] == password:
-        return True
-    return False
+    return _matches(USER_DB.get(username), password)
+
+def verify_album_password(album_id, password):
+    """Check if password unlocks the given album"""
+    return _matches(PASSWORD_DB.get(album_id), password)
 
 def create_token(subject, expires_in=86400):  # Default: 24 hours
     """Create a JWT token for authentication
@@ -51,6 +116,10 @@ def create_token(subject, expires_in=86400):  # Default: 24 hours
 
 def verify_token(token):
     """Verify and decode a JWT token
+
+    Verified payloads are cached until their expiry, so repeat calls with the
+    same token skip the signature check. The revocation store is consulted on
+    every call, cached or not.
     
     Args:
         token: JWT token to verify
@@ -61,5 +130,37 @@ def verify_token(token):
     Raises:
         Exception if token is invalid
     """
-    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-    return payload
\ No newline at end of file
+    now = time.time()
+    with _cache_lock:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            if payload['exp'] > now:
+                _token_cache.move_to_end(token)
+            else:
+                del _token_cache[token]
+                payload = None
+
+    if payload is None:
+        # Cache miss or expired: full signature and expiry check
+        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+
+    if payload.get('jti') and _revocations.is_revoked(payload['jti']):
+        raise jwt.InvalidTokenError("Token has been revoked")
+
+    with _cache_lock:
+        _token_cache[token] = payload
+        _token_cache.move_to_end(token)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return payload
+
+def revoke_token(payload):
+    """Revoke a verified token so it is rejected until it expires
+
+    Args:
+        payload: Decoded token payload, as returned by verify_token
+    """
+    _revocations.revoke(payload['jti'], payload['exp'])
+    with _cache_lock:
+        for token in [t for t, cached in _token_cache.items() if cached.get('jti') == payload['jti']]:
+            del _token_cache[token]
\ No newline at end of file
@@ -1,4 +1,5 @@
 # config.py
+import os
 
 # Cloudflare R2 Configuration
 R2_CONFIG = {
@@ -14,5 +15,16 @@ JWT_SECRET = "pixelperfect-secure-albums-secret-key-2023"
 
 # ML API Base URL
 ML_API_BASE_URL = "http://127.0.0.1:8080" # Use localhost for local testing
+# Shared secret sent to the ML API; must match ML_API_KEY in its environment
+ML_API_KEY = os.environ.get("ML_API_KEY", "")
 # Replace with your deployed API URL for production:
-# ML_API_BASE_URL = "https://your-fastapi-app-url.com"
\ No newline at end of file
+# ML_API_BASE_URL = "https://your-fastapi-app-url.com"
+
+# Guest search rate limits: (requests per second, burst size)
+SEARCH_RATE_LIMIT_PER_TOKEN = (0.5, 10)
+SEARCH_RATE_LIMIT_PER_ALBUM = (10, 100)
+
+# Face search admission control for calls to the ML API
+ML_MAX_IN_FLIGHT = 8       # Concurrent searches sent to the ML API
+ML_MAX_QUEUED = 32         # Searches allowed to wait for a slot before shedding
+ML_QUEUE_TIMEOUT = 10      # Seconds a search may wait for a slot
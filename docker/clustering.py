@@ -0,0 +1,199 @@
+# clustering.py
+import numpy as np
+
+CLUSTER_THRESHOLD = 0.55  # Same cosine similarity cut-off as face search
+MAX_ITERATIONS = 20
+SIMILARITY_CHUNK_ROWS = 1024  # Bounds the size of each similarity block
+MAX_NEIGHBOURS = 32  # Strongest links kept per face; bounds the graph to N x 32 edges
+
+
+def _similarity_graph(matrix: np.ndarray, threshold: float, max_neighbours: int = MAX_NEIGHBOURS):
+    """Link each face to its most similar faces above the threshold.
+
+    Embeddings are L2-normalized, so a dot product is the cosine similarity.
+    Rows are compared in chunks to avoid materializing the full N x N matrix.
+
+    Returns:
+        (indptr, neighbours, weights) in CSR layout: the links of face i are
+        neighbours[indptr[i]:indptr[i + 1]] with the matching weights
+    """
+    count = len(matrix)
+    k = min(max_neighbours, count - 1)
+    if k <= 0:
+        return np.zeros(count + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype="float32")
+
+    degrees = np.zeros(count, dtype=np.int64)
+    neighbour_parts, weight_parts = [], []
+    for start in range(0, count, SIMILARITY_CHUNK_ROWS):
+        sims = matrix[start:start + SIMILARITY_CHUNK_ROWS] @ matrix.T
+        rows = np.arange(len(sims))
+        sims[rows, start + rows] = -np.inf  # No self links
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        linked = top_sims > threshold
+        degrees[start:start + len(sims)] = linked.sum(axis=1)
+        neighbour_parts.append(top[linked])
+        weight_parts.append(top_sims[linked])
+
+    indptr = np.concatenate(([0], np.cumsum(degrees)))
+    return indptr, np.concatenate(neighbour_parts), np.concatenate(weight_parts)
+
+
+def _chinese_whispers(graph, seed=0):
+    """Label graph nodes by iteratively adopting the heaviest neighbouring label."""
+    indptr, neighbours, weights = (part.tolist() for part in graph)
+    labels = list(range(len(indptr) - 1))
+    rng = np.random.default_rng(seed)
+    for _ in range(MAX_ITERATIONS):
+        changed = False
+        for node in rng.permutation(len(labels)).tolist():
+            first, last = indptr[node], indptr[node + 1]
+            if first == last:
+                continue
+            totals = {}
+            for neighbour, weight in zip(neighbours[first:last], weights[first:last]):
+                label = labels[neighbour]
+                totals[label] = totals.get(label, 0.0) + weight
+            best = max(totals, key=totals.get)
+            if best != labels[node]:
+                labels[node] = best
+                changed = True
+        if not changed:
+            break
+    return labels
+
+
+def _centroid(vectors: np.ndarray) -> np.ndarray:
+    centroid = vectors.mean(axis=0)
+    return centroid / (np.linalg.norm(centroid) or 1.0)
+
+
+def _stable_ids(centroids: np.ndarray, previous, threshold: float):
+    """Give new clusters the id of the previous cluster with the closest centroid.
+
+    Pairs are matched greedily, most similar first, and only above the
+    threshold; clusters left unmatched get ids never used before.
+    """
+    ids = [None] * len(centroids)
+    if previous:
+        old_centroids = np.array([cluster["centroid"] for cluster in previous])
+        sims = centroids @ old_centroids.T
+        taken = set()
+        for new, old in zip(*np.unravel_index(np.argsort(-sims, axis=None), sims.shape)):
+            if sims[new, old] <= threshold:
+                break
+            if ids[new] is None and old not in taken:
+                ids[new] = previous[old]["id"]
+                taken.add(old)
+    next_id = max((cluster["id"] for cluster in previous or []), default=-1) + 1
+    for i, cluster_id in enumerate(ids):
+        if cluster_id is None:
+            ids[i] = next_id
+            next_id += 1
+    return ids
+
+
+def cluster_embeddings(keys, matrix: np.ndarray, threshold: float = CLUSTER_THRESHOLD, previous=None):
+    """Group an album's faces into people.
+
+    Args:
+        keys: Object keys, one per row of `matrix`
+        matrix: L2-normalized embeddings, shape (N, D)
+        threshold: Minimum cosine similarity for two faces to be linked
+        previous: The album's clusters before this change, if any. A person
+            keeps their id as long as their centroid still matches.
+
+    Returns:
+        List of {"id", "centroid", "members"} dicts, largest cluster first
+    """
+    if len(keys) == 0:
+        return []
+    labels = _chinese_whispers(_similarity_graph(matrix, threshold))
+
+    groups = {}
+    for row, label in enumerate(labels):
+        groups.setdefault(label, []).append(row)
+
+    ordered = sorted(groups.values(), key=len, reverse=True)
+    centroids = np.array([_centroid(matrix[rows]) for rows in ordered])
+    return [
+        {
+            "id": cluster_id,
+            "centroid": centroid.tolist(),
+            "members": [keys[row] for row in rows],
+        }
+        for cluster_id, centroid, rows in zip(_stable_ids(centroids, previous, threshold), centroids, ordered)
+    ]
+
+
+def remove_member(clusters, object_key, embeddings):
+    """Drop a photo from its cluster and recompute that cluster's centroid.
+
+    Args:
+        clusters: Cluster list as returned by cluster_embeddings (modified in place)
+        object_key: Key of the photo being removed
+        embeddings: The album's remaining {key: record} map
+    """
+    for cluster in clusters:
+        if object_key in cluster["members"]:
+            cluster["members"].remove(object_key)
+            if cluster["members"]:
+                vectors = np.array([embeddings[key]["embedding"] for key in cluster["members"]])
+                cluster["centroid"] = _centroid(vectors).tolist()
+            else:
+                clusters.remove(cluster)
+            return
+
+
+def add_members(clusters, keys, matrix: np.ndarray, embeddings, threshold: float = CLUSTER_THRESHOLD):
+    """Assign newly indexed faces to the album's existing people.
+
+    Each face joins the person whose centroid it matches best above the
+    threshold; faces matching nobody are clustered among themselves into new
+    people. This is O(new faces x people), so it can run on every upload
+    where a full cluster_embeddings() run could not.
+
+    Args:
+        clusters: Cluster list as returned by cluster_embeddings (modified in place)
+        keys: Object keys of the new faces, one per row of `matrix`
+        matrix: L2-normalized embeddings of the new faces, shape (M, D)
+        embeddings: The album's full {key: record} map, new faces included
+        threshold: Minimum cosine similarity to an existing person's centroid
+    """
+    if len(keys) == 0:
+        return
+    unmatched, changed = [], set()
+    if clusters:
+        centroids = np.array([cluster["centroid"] for cluster in clusters], dtype="float32")
+        scores = matrix @ centroids.T
+        best = scores.argmax(axis=1)
+        for row, key in enumerate(keys):
+            if scores[row, best[row]] > threshold:
+                clusters[best[row]]["members"].append(key)
+                changed.add(int(best[row]))
+            else:
+                unmatched.append(row)
+    else:
+        unmatched = list(range(len(keys)))
+
+    for position in changed:
+        cluster = clusters[position]
+        vectors = np.array([embeddings[key]["embedding"] for key in cluster["members"]])
+        cluster["centroid"] = _centroid(vectors).tolist()
+
+    next_id = max((cluster["id"] for cluster in clusters), default=-1) + 1
+    for cluster in cluster_embeddings([keys[row] for row in unmatched], matrix[unmatched], threshold):
+        cluster["id"] = next_id
+        next_id += 1
+        clusters.append(cluster)
+    clusters.sort(key=lambda cluster: len(cluster["members"]), reverse=True)
+
+
+def match_clusters(query: np.ndarray, clusters, threshold: float = CLUSTER_THRESHOLD):
+    """Return (cluster, score) pairs whose centroid matches the query, best first."""
+    if not clusters:
+        return []
+    centroids = np.array([cluster["centroid"] for cluster in clusters])
+    scores = centroids @ query
+    order = np.argsort(-scores)
+    return [(clusters[i], float(scores[i])) for i in order if scores[i] > threshold]
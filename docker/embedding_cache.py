@@ -0,0 +1,294 @@
+# embedding_cache.py
+"""Persistent local cache of album embedding files.
+
+Each cached album is stored as two files in the cache directory:
+
+    <album>_embeddings.meta.json    etag, object keys, per-key records, clusters and their model
+    <album>_embeddings.<tag>.npy    float32 embedding matrix, one row per key
+
+The matrix is memory-mapped, so every uvicorn worker on a node shares one
+copy through the OS page cache instead of each parsing its own. Entries are
+revalidated against R2 with a conditional GET (If-None-Match) and evicted
+least-recently-used first once the cache exceeds its size limit.
+
+Each worker also keeps up to `max_opened` albums mapped. A mapping is
+dropped as soon as its files are gone from the cache directory, i.e. once
+any worker evicted the album or replaced it with a newer version, so the
+disk space of unlinked matrices is released.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from botocore.exceptions import ClientError
+
+from embedding_index import load_index, INDEX_FORMAT_VERSION
+from metrics import timed, EMBEDDINGS_LOAD_LATENCY, EMBEDDINGS_CACHE_EVENTS, R2_LATENCY
+
+META_SUFFIX = ".meta.json"
+MAX_OPENED = 64  # Albums each process keeps memory-mapped
+# Unreferenced matrices and temporary files younger than this may belong to
+# a write still in progress in another worker, so eviction leaves them alone
+ORPHAN_GRACE_SECONDS = 300
+
+
+class CachedIndex:
+    """Read-only view of a cached album index."""
+
+    def __init__(self, etag, keys, matrix, records, clusters, matrix_file=None, clusters_model=None):
+        self.etag = etag
+        self.matrix_file = matrix_file  # Name of the .npy file in the cache directory
+        self.keys = keys
+        self.matrix = matrix  # (N, D) float32, memory-mapped when non-empty
+        self.records = records  # {key: record without its embedding}
+        self.clusters = clusters  # None if the album has not been clustered
+        self.clusters_model = clusters_model  # Model version of the embeddings that were clustered
+        self._model_rows = {}
+
+    def to_index(self):
+        """Return a mutable index document, e.g. to add or remove embeddings."""
+        embeddings = {
+            key: dict(self.records.get(key, {}), embedding=self.matrix[row].tolist())
+            for row, key in enumerate(self.keys)
+        }
+        index = {"version": INDEX_FORMAT_VERSION, "embeddings": embeddings}
+        if self.clusters is not None:
+            index["clusters"] = self.clusters
+            index["clusters_model"] = self.clusters_model
+        return index
+
+    def model_rows(self, model_version):
+        """Row numbers of the embeddings produced by `model_version`."""
+        rows = self._model_rows.get(model_version)
+        if rows is None:
+            rows = np.array(
+                [row for row, key in enumerate(self.keys) if self.records.get(key, {}).get("model") == model_version],
+                dtype=np.int64,
+            )
+            self._model_rows[model_version] = rows
+        return rows
+
+
+class EmbeddingCache:
+    """Size-bounded LRU disk cache of album indexes, backed by R2."""
+
+    def __init__(self, s3_client, bucket, public_base_url, cache_dir, max_bytes, max_opened=MAX_OPENED):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.public_base_url = public_base_url
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_opened = max_opened
+        self._lock = threading.RLock()
+        # Albums mapped by this process, least recently used first: {embedding_file: CachedIndex}
+        self._opened = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, embedding_file):
+        """Return the album's CachedIndex, or None if it does not exist in R2."""
+        cached = self._get_opened(embedding_file)
+        meta = None if cached else self._read_meta(embedding_file)
+        request = {"Bucket": self.bucket, "Key": embedding_file}
+        if cached or meta:
+            request["IfNoneMatch"] = cached.etag if cached else meta["etag"]
+
+        try:
+            with timed(EMBEDDINGS_LOAD_LATENCY, "embeddings_download", phase="download"):
+                response = self.s3.get_object(**request)
+                body = response["Body"].read()
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code in ("304", "NotModified") and (cached or meta):
+                cached = cached or self._open(embedding_file, meta)
+                if cached is not None:
+                    EMBEDDINGS_CACHE_EVENTS.labels(event="hit").inc()
+                    self._touch(embedding_file)
+                    return cached
+                # Matrix was evicted underneath us; fetch the whole file again
+                return self._refetch(embedding_file)
+            if code in ("404", "NoSuchKey"):
+                EMBEDDINGS_CACHE_EVENTS.labels(event="absent").inc()
+                self.invalidate(embedding_file)
+                return None
+            raise
+
+        EMBEDDINGS_CACHE_EVENTS.labels(event="miss").inc()
+        with timed(EMBEDDINGS_LOAD_LATENCY, "embeddings_parse", phase="parse"):
+            index = load_index(json.loads(body), self.public_base_url)
+        return self._store(embedding_file, index, response["ETag"])
+
+    def put(self, embedding_file, index):
+        """Upload an index document to R2 and keep it in the cache."""
+        body = json.dumps(index).encode()
+        with timed(R2_LATENCY, "r2_upload", operation="upload"):
+            response = self.s3.put_object(
+                Bucket=self.bucket, Key=embedding_file, Body=body, ContentType="application/json"
+            )
+        return self._store(embedding_file, index, response["ETag"])
+
+    def invalidate(self, embedding_file):
+        """Drop an album from the cache."""
+        with self._lock:
+            self._remove(embedding_file)
+
+    # --- Internal helpers ---
+
+    def _refetch(self, embedding_file):
+        self.invalidate(embedding_file)
+        return self.get(embedding_file)
+
+    def _meta_path(self, embedding_file):
+        return os.path.join(self.cache_dir, embedding_file + META_SUFFIX)
+
+    def _read_meta(self, embedding_file):
+        try:
+            with open(self._meta_path(embedding_file), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, embedding_file, meta):
+        matrix_path = os.path.join(self.cache_dir, meta["matrix_file"])
+        try:
+            if meta["keys"]:
+                matrix = np.load(matrix_path, mmap_mode="r")
+            else:
+                matrix = np.zeros((0, 0), dtype="float32")
+        except (OSError, ValueError):
+            return None
+        cached = CachedIndex(meta["etag"], meta["keys"], matrix, meta["records"], meta.get("clusters"),
+                             meta["matrix_file"], meta.get("clusters_model"))
+        with self._lock:
+            self._opened[embedding_file] = cached
+            self._opened.move_to_end(embedding_file)
+            # Drop mappings of albums another worker evicted or replaced, then the least recently used
+            for name in [name for name, entry in self._opened.items() if not self._is_current(name, entry)]:
+                del self._opened[name]
+            while len(self._opened) > self.max_opened:
+                self._opened.popitem(last=False)
+        return cached
+
+    def _get_opened(self, embedding_file):
+        """Return this process's mapping of an album if its files are still the cached version."""
+        with self._lock:
+            cached = self._opened.get(embedding_file)
+            if cached is None:
+                return None
+            if not self._is_current(embedding_file, cached):
+                del self._opened[embedding_file]
+                return None
+            self._opened.move_to_end(embedding_file)
+            return cached
+
+    def _is_current(self, embedding_file, cached):
+        # The matrix file name is derived from the ETag, so a newer version or an
+        # eviction by any worker removes the file this mapping was opened from
+        return (os.path.exists(self._meta_path(embedding_file))
+                and os.path.exists(os.path.join(self.cache_dir, cached.matrix_file)))
+
+    def _touch(self, embedding_file):
+        """Mark an album as recently used for LRU eviction."""
+        try:
+            os.utime(self._meta_path(embedding_file))
+        except OSError:
+            pass
+
+    def _store(self, embedding_file, index, etag):
+        keys = list(index["embeddings"])
+        matrix = np.array([index["embeddings"][key]["embedding"] for key in keys], dtype="float32")
+        records = {
+            key: {field: value for field, value in record.items() if field != "embedding"}
+            for key, record in index["embeddings"].items()
+        }
+        tag = hashlib.sha1(etag.encode()).hexdigest()[:12]
+        matrix_file = f"{embedding_file}.{tag}.npy"
+        meta = {
+            "etag": etag,
+            "matrix_file": matrix_file,
+            "keys": keys,
+            "records": records,
+            "clusters": index.get("clusters"),
+            "clusters_model": index.get("clusters_model"),
+        }
+
+        with self._lock:
+            previous = self._read_meta(embedding_file)
+            # Write to temporary names and rename so other workers never see partial files
+            matrix_path = os.path.join(self.cache_dir, matrix_file)
+            tmp_matrix = f"{matrix_path}.{os.getpid()}.tmp"
+            with open(tmp_matrix, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_matrix, matrix_path)
+            meta_path = self._meta_path(embedding_file)
+            tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+            with open(tmp_meta, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+            # Workers that already mapped the old matrix keep reading it until they close it
+            if previous and previous["matrix_file"] != matrix_file:
+                self._unlink(os.path.join(self.cache_dir, previous["matrix_file"]))
+            self._evict()
+
+        return self._open(embedding_file, meta) or CachedIndex(
+            etag, keys, matrix, records, meta["clusters"], matrix_file, meta["clusters_model"])
+
+    def _remove(self, embedding_file):
+        self._opened.pop(embedding_file, None)
+        meta = self._read_meta(embedding_file)
+        if meta:
+            self._unlink(os.path.join(self.cache_dir, meta["matrix_file"]))
+        self._unlink(self._meta_path(embedding_file))
+
+    def _evict(self):
+        """Remove orphaned files, then least recently used albums until the cache fits in max_bytes."""
+        names = os.listdir(self.cache_dir)
+        entries, referenced, total = [], set(), 0
+        for name in names:
+            if not name.endswith(META_SUFFIX):
+                continue
+            embedding_file = name[:-len(META_SUFFIX)]
+            meta = self._read_meta(embedding_file)
+            if not meta:
+                continue
+            referenced.add(meta["matrix_file"])
+            try:
+                meta_stat = os.stat(os.path.join(self.cache_dir, name))
+                size = meta_stat.st_size + os.path.getsize(os.path.join(self.cache_dir, meta["matrix_file"]))
+            except OSError:
+                continue
+            entries.append((meta_stat.st_mtime, embedding_file, size))
+            total += size
+
+        # Matrices no meta file points to (two workers storing different
+        # versions at once) and temporary files left by crashed writes
+        now = time.time()
+        for name in names:
+            if not (name.endswith(".tmp") or (name.endswith(".npy") and name not in referenced)):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                orphan = os.stat(path)
+            except OSError:
+                continue
+            if now - orphan.st_mtime > ORPHAN_GRACE_SECONDS:
+                self._unlink(path)
+                EMBEDDINGS_CACHE_EVENTS.labels(event="orphan_removed").inc()
+            else:
+                total += orphan.st_size
+
+        for _, embedding_file, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(embedding_file)
+            EMBEDDINGS_CACHE_EVENTS.labels(event="evicted").inc()
+            total -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,59 @@
+# embedding_index.py
+"""Stored format of an album's `<album>_embeddings.json`.
+
+Version 2 documents map each photo's R2 object key to its record:
+
+    {"version": 2, "embeddings": {"<object key>": {"embedding": [...], "confidence": 0.99,
+                                                   "model": "<facenet>+<detector>"}},
+     "clusters": [{"id": 0, "centroid": [...], "members": ["<object key>", ...]}],
+     "clusters_model": "<facenet>+<detector>"}
+
+`confidence` is the face detector's score for the indexed face and `model`
+identifies the weights and detector that produced the embedding (missing on
+records indexed before versioning, which are treated as stale). Public URLs
+are not stored; they are built from the key when a response is returned, so
+the CDN domain can change without reindexing. `clusters` groups the album's
+faces into people (see clustering.py) and is optional; `clusters_model` is
+the model whose embeddings were clustered. Searches and clustering only use
+embeddings from the running model, since scores across models are
+meaningless. Version 1 files (a list of {"url", "embedding"} entries) are
+converted on load.
+"""
+from urllib.parse import urlparse
+
+INDEX_FORMAT_VERSION = 2
+
+
+def new_index():
+    """Return an empty index document."""
+    return {"version": INDEX_FORMAT_VERSION, "embeddings": {}}
+
+
+def object_key_from_url(url: str, public_base_url: str) -> str:
+    """Map a public object URL back to its R2 object key.
+
+    URLs under a previous public domain are handled by falling back to the
+    URL path, which is the object key for R2 public buckets.
+    """
+    prefix = public_base_url.rstrip("/") + "/"
+    if url.startswith(prefix):
+        return url[len(prefix):]
+    return urlparse(url).path.lstrip("/")
+
+
+def object_url(object_key: str, public_base_url: str) -> str:
+    """Build the public URL for an R2 object key."""
+    return f"{public_base_url.rstrip('/')}/{object_key}"
+
+
+def load_index(data, public_base_url: str):
+    """Return a version 2 index document from parsed JSON of any version."""
+    if isinstance(data, list):
+        index = new_index()
+        for item in data:
+            key = object_key_from_url(item["url"], public_base_url)
+            index["embeddings"][key] = {"embedding": item["embedding"]}
+        return index
+    if data.get("version") != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embeddings format version: {data.get('version')}")
+    return data
@@ -1,23 +1,36 @@
 # main_fastapi.py
 
 import os
-import io
-import json
+import time
+import hmac
+import heapq
+import hashlib
+import threading
 import uvicorn
 import requests
 import numpy as np
-from PIL import Image
-from typing import List
+from typing import List, Optional
 from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request, Response, Depends
 from mtcnn.mtcnn import MTCNN
 from tensorflow.keras.models import load_model
 from sklearn.preprocessing import Normalizer
-from scipy.spatial import distance
 import boto3
 from botocore.exceptions import ClientError
 
+from metrics import (
+    timed, start_request_timing, reset_request_timing, get_request_timings,
+    format_server_timing, render_metrics, REQUEST_LATENCY, REQUESTS_IN_FLIGHT,
+    IMAGE_FETCH_LATENCY, INFERENCE_LATENCY, SIMILARITY_SCAN_LATENCY, CLUSTERING_LATENCY,
+    INDEXING_QUEUE_DEPTH, TIMING_REQUEST_HEADER,
+)
+from embedding_index import new_index, object_key_from_url, object_url
+from embedding_cache import EmbeddingCache
+from clustering import cluster_embeddings, add_members, remove_member, match_clusters
+from preprocess import new_face_batch, decode_image, locate_face, write_face, DETECTOR_VERSION
+from reindex import Reindexer
+
 # --- Configuration ---
 # Assuming config.py is in the parent directory of the 'docker' folder
 # If running locally, you might need to adjust this path
@@ -30,7 +43,13 @@ R2_CONFIG = {
 }
 
 FACENET_MODEL_PATH = 'docker/models/facenet_keras.h5' # Assuming model is in the same directory when running
-EMBEDDINGS_DIR = "data/embeddings"  # Directory for temporary local storage
+EMBEDDINGS_DIR = "data/embeddings"  # Local cache of album embedding files, shared by all workers
+REINDEX_CHECKPOINT_PATH = "data/reindex_checkpoint.json"
+INDEXING_BATCH_SIZE = 64  # Photos preprocessed and run through FaceNet together
+COVER_CANDIDATES = 5  # Best faces returned after indexing, for choosing album covers
+EMBEDDINGS_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDINGS_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Shared secret the gateway sends as X-ML-API-Key; when set, album endpoints reject other callers
+ML_API_KEY = os.environ.get("ML_API_KEY", "")
 os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
 
 # --- FastAPI App Initialization ---
@@ -41,16 +60,35 @@ facenet_model = None
 mtcnn_detector = None
 in_encoder = Normalizer()
 s3_client = None
+embedding_cache = None
+reindexer = None
+# Identifies the weights and detector that produced an embedding, e.g. "facenet-1a2b3c4d5e6f+mtcnn-0.1.1/draft1280"
+embedding_model_version = None
+# Full clustering of albums that have none runs here, one album at a time, off the request path
+clustering_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clustering")
+_clustering_pending = set()
+_clustering_lock = threading.Lock()
+
+def facenet_version(model_path: str) -> str:
+    """Version tag of the FaceNet weights: FACENET_MODEL_VERSION, or a hash of the file."""
+    if os.environ.get("FACENET_MODEL_VERSION"):
+        return os.environ["FACENET_MODEL_VERSION"]
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f"facenet-{digest.hexdigest()[:12]}"
 
 @app.on_event("startup")
 def load_resources():
     """Load models and initialize R2 client at startup."""
-    global facenet_model, mtcnn_detector, s3_client
+    global facenet_model, mtcnn_detector, s3_client, embedding_cache, reindexer, embedding_model_version
 
     # Load ML Models
     if os.path.exists(FACENET_MODEL_PATH):
         facenet_model = load_model(FACENET_MODEL_PATH)
         mtcnn_detector = MTCNN()
+        embedding_model_version = f"{facenet_version(FACENET_MODEL_PATH)}+{DETECTOR_VERSION}"
         print("✅ Models loaded successfully.")
     else:
         print(f"❌ ERROR: Model file not found at {FACENET_MODEL_PATH}")
@@ -63,163 +101,435 @@ def load_resources():
             aws_access_key_id=R2_CONFIG["aws_access_key_id"],
             aws_secret_access_key=R2_CONFIG["aws_secret_access_key"],
         )
+        embedding_cache = EmbeddingCache(
+            s3_client, R2_CONFIG["bucket_name"], R2_CONFIG["public_base_url"],
+            EMBEDDINGS_DIR, EMBEDDINGS_CACHE_MAX_BYTES,
+        )
         print("✅ R2/S3 client initialized successfully.")
+        if facenet_model:
+            reindexer = Reindexer(
+                s3_client, embedding_cache, R2_CONFIG["bucket_name"], R2_CONFIG["public_base_url"],
+                index_photos, refresh_clusters, embedding_model_version, REINDEX_CHECKPOINT_PATH,
+            )
     except Exception as e:
         print(f"❌ ERROR: Failed to initialize R2/S3 client: {e}")
 
 
+def route_template(request: Request) -> str:
+    """Path template of the route that handled a request, e.g. "/reindex/".
+
+    The pinned FastAPI/Starlette do not put the route in the scope, but the
+    router does record the matched endpoint function.
+    """
+    endpoint = request.scope.get("endpoint")
+    for route in app.routes:
+        if getattr(route, "endpoint", None) is endpoint and endpoint is not None:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Record request latency and optionally return the per-stage breakdown."""
+    start = time.perf_counter()
+    timing_token = start_request_timing()
+    REQUESTS_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if request.headers.get(TIMING_REQUEST_HEADER):
+            timings = get_request_timings() + [("total", time.perf_counter() - start)]
+            response.headers["Server-Timing"] = format_server_timing(timings)
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template, not the raw path, so label values stay bounded
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            endpoint=route_template(request),
+            status=status,
+        ).observe(time.perf_counter() - start)
+        reset_request_timing(timing_token)
+
+
+def require_admin(x_ml_api_key: Optional[str] = Header(None)):
+    """Route dependency for operator actions; always requires ML_API_KEY."""
+    if not ML_API_KEY or not hmac.compare_digest(x_ml_api_key or "", ML_API_KEY):
+        raise HTTPException(status_code=403, detail="Requires the ML API key.")
+
+
+def require_gateway(x_ml_api_key: Optional[str] = Header(None)):
+    """Route dependency for endpoints that read or change an album.
+
+    The gateway checks that the caller may use the album before forwarding,
+    so these must not be reachable without going through it.
+    """
+    if ML_API_KEY and not hmac.compare_digest(x_ml_api_key or "", ML_API_KEY):
+        raise HTTPException(status_code=403, detail="This endpoint is only available through the gateway.")
+
+
 # --- Core Functions ---
-def extract_face(image_bytes: bytes, required_size=(160, 160)):
+def extract_face(image_bytes: bytes, out: np.ndarray):
+    """Detect the main face in a photo and write its standardized crop into `out`.
+
+    Returns the detection confidence, or None if no face was found.
+    """
     try:
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        pixels = np.asarray(image)
-        results = mtcnn_detector.detect_faces(pixels)
-        if not results: return None
-        x1, y1, width, height = results[0]['box']
-        x1, y1 = abs(x1), abs(y1)
-        x2, y2 = x1 + width, y1 + height
-        face_pixels = pixels[y1:y2, x1:x2]
-        face_image = Image.fromarray(face_pixels).resize(required_size)
-        return np.asarray(face_image)
+        image = decode_image(image_bytes)
+        detection = locate_face(image, mtcnn_detector)
+        if detection is None: return None
+        box, confidence = detection
+        write_face(image, box, out)
+        return confidence
     except Exception as e:
         print(f"Face extraction error: {e}")
         return None
 
-def get_embedding(face_pixels: np.ndarray) -> np.ndarray:
-    face_pixels = face_pixels.astype('float32')
-    mean, std = face_pixels.mean(), face_pixels.std()
-    face_pixels = (face_pixels - mean) / std
-    sample = np.expand_dims(face_pixels, axis=0)
-    embedding = facenet_model.predict(sample)
-    return embedding[0]
+def get_embeddings(face_batch: np.ndarray) -> np.ndarray:
+    """Return normalized FaceNet embeddings for a batch of standardized face crops."""
+    with timed(INFERENCE_LATENCY, "facenet_inference"):
+        embeddings = facenet_model.predict(face_batch)
+    return in_encoder.transform(embeddings)
 
-# --- API Endpoints ---
+def index_photos(pending_keys):
+    """Compute embedding records for photos, in batches of INDEXING_BATCH_SIZE.
 
-@app.post("/add_embeddings_from_urls/")
-async def add_embeddings_from_urls(urls: List[str] = Form(...), embedding_file: str = Form(...)):
-    if not facenet_model or not s3_client:
-        raise HTTPException(status_code=503, detail="A core service (ML model or Storage) is not available.")
-    
-    local_temp_path = os.path.join(EMBEDDINGS_DIR, embedding_file)
-    url_embedding_map = []
+    Args:
+        pending_keys: {object key: URL to download the photo from}
 
-    try:
-        s3_client.download_file(R2_CONFIG["bucket_name"], embedding_file, local_temp_path)
-        with open(local_temp_path, 'r') as f:
-            url_embedding_map = json.load(f)
-    except ClientError as e:
-        if e.response['Error']['Code'] == '404':
-            url_embedding_map = []
-        else:
-            raise HTTPException(status_code=500, detail=f"R2 download error: {e}")
+    Returns:
+        {object key: record} for every photo in which a face was found
+    """
+    items = list(pending_keys.items())
+    face_batch = new_face_batch(min(INDEXING_BATCH_SIZE, len(items)))
+    new_embeddings = {}
 
-    def process_url(url: str):
+    def process_url(slot: int, url: str):
         try:
-            response = requests.get(url, timeout=20)
+            with timed(IMAGE_FETCH_LATENCY, "image_fetch"):
+                response = requests.get(url, timeout=20)
             if response.status_code != 200: return None
-            face_pixels = extract_face(response.content)
-            if face_pixels is None: return None
-            embedding = get_embedding(face_pixels)
-            normalized_embedding = in_encoder.transform([embedding])[0]
-            return {"url": url, "embedding": normalized_embedding.tolist()}
+            return extract_face(response.content, face_batch[slot])
         except Exception:
             return None
+        finally:
+            INDEXING_QUEUE_DEPTH.dec()
 
+    INDEXING_QUEUE_DEPTH.inc(len(items))
     with ThreadPoolExecutor(max_workers=8) as executor:
-        results = executor.map(process_url, urls)
-        new_embeddings = [res for res in results if res]
+        for start in range(0, len(items), INDEXING_BATCH_SIZE):
+            chunk = items[start:start + INDEXING_BATCH_SIZE]
+            confidences = list(executor.map(process_url, range(len(chunk)), [url for _, url in chunk]))
+            slots = [slot for slot, confidence in enumerate(confidences) if confidence is not None]
+            if not slots:
+                continue
+            embeddings = get_embeddings(face_batch[slots])
+            for slot, embedding in zip(slots, embeddings):
+                new_embeddings[chunk[slot][0]] = {
+                    "embedding": embedding.tolist(),
+                    "confidence": confidences[slot],
+                    "model": embedding_model_version,
+                }
+    return new_embeddings
+
+def refresh_clusters(index):
+    """Recompute the album's people clusters from all of its embeddings, keeping person ids.
+
+    Costs a full similarity graph; only called from background work such as the re-indexer.
+    Embeddings from other model versions are left out.
+    """
+    keys = [key for key, record in index["embeddings"].items() if record.get("model") == embedding_model_version]
+    matrix = np.array([index["embeddings"][key]["embedding"] for key in keys], dtype="float32")
+    previous = index.get("clusters") if index.get("clusters_model") == embedding_model_version else None
+    with timed(CLUSTERING_LATENCY, "clustering"):
+        index["clusters"] = cluster_embeddings(keys, matrix, previous=previous)
+    index["clusters_model"] = embedding_model_version
+
+def has_current_clusters(clusters, clusters_model):
+    return clusters is not None and clusters_model == embedding_model_version
+
+def update_clusters(index, new_keys):
+    """Assign newly indexed faces to the album's people.
+
+    Returns False if the album has not been clustered with the running model;
+    the caller then schedules a full clustering with schedule_clustering().
+    """
+    clusters = index.get("clusters")
+    if not has_current_clusters(clusters, index.get("clusters_model")):
+        return False
+    # Re-indexed photos leave their old person before joining by their new embedding
+    members = {key for cluster in clusters for key in cluster["members"]}
+    for key in new_keys:
+        if key in members:
+            remove_member(clusters, key, index["embeddings"])
+    matrix = np.array([index["embeddings"][key]["embedding"] for key in new_keys], dtype="float32")
+    with timed(CLUSTERING_LATENCY, "clustering"):
+        add_members(clusters, new_keys, matrix, index["embeddings"])
+    return True
+
+def schedule_clustering(embedding_file: str):
+    """Cluster an album that has no clusters in the background, once."""
+    with _clustering_lock:
+        if embedding_file in _clustering_pending:
+            return
+        _clustering_pending.add(embedding_file)
+    clustering_executor.submit(_cluster_album, embedding_file)
+
+def _cluster_album(embedding_file: str):
+    try:
+        for _ in range(3):
+            cached = embedding_cache.get(embedding_file)
+            if cached is None or has_current_clusters(cached.clusters, cached.clusters_model):
+                return
+            rows = cached.model_rows(embedding_model_version)
+            with timed(CLUSTERING_LATENCY, "clustering"):
+                clusters = cluster_embeddings([cached.keys[row] for row in rows], cached.matrix[rows])
+            # Re-read just before writing; if the album changed meanwhile, cluster its new version
+            latest = embedding_cache.get(embedding_file)
+            if latest is not None and latest.etag == cached.etag:
+                index = latest.to_index()
+                index["clusters"] = clusters
+                index["clusters_model"] = embedding_model_version
+                embedding_cache.put(embedding_file, index)
+                return
+    except Exception as e:
+        print(f"Failed to cluster {embedding_file}: {e}")
+    finally:
+        with _clustering_lock:
+            _clustering_pending.discard(embedding_file)
+
+def album_clusters(embedding_file: str, cached):
+    """Return a cached album's clusters, or None while they are being computed.
+
+    Albums indexed before clustering existed, or clustered with another
+    model, are clustered in the background on first use.
+    """
+    if not has_current_clusters(cached.clusters, cached.clusters_model):
+        schedule_clustering(embedding_file)
+        return None
+    return cached.clusters
+
+def scan_faces(cached, query: np.ndarray, threshold: float):
+    """Return [(object key, score)] of every face in the album matching the query, best first.
+
+    Only embeddings from the running model are scored; photos not yet
+    re-indexed after a model change are left out until they are.
+    """
+    results = []
+    with timed(SIMILARITY_SCAN_LATENCY, "similarity_scan"):
+        rows = cached.model_rows(embedding_model_version)
+        if len(rows):
+            matrix = cached.matrix if len(rows) == len(cached.keys) else cached.matrix[rows]
+            # Rows and query are L2-normalized, so the dot product is the cosine similarity
+            similarities = matrix @ query.astype("float32")
+            for position in np.nonzero(similarities > threshold)[0]:
+                results.append((cached.keys[rows[position]], float(similarities[position])))
+    results.sort(key=lambda result: result[1], reverse=True)
+    return results
+
+async def query_embedding(file: UploadFile) -> np.ndarray:
+    """Return the normalized embedding of the face in an uploaded query image."""
+    input_bytes = await file.read()
+    face_batch = new_face_batch(1)
+    if extract_face(input_bytes, face_batch[0]) is None:
+        raise HTTPException(status_code=400, detail="No face detected in the uploaded image.")
+    return get_embeddings(face_batch)[0]
+
+def load_album_index(embedding_file: str):
+    """Return the album's CachedIndex, or None if it has no embeddings file."""
+    try:
+        return embedding_cache.get(embedding_file)
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"R2 download error: {e}")
+
+def save_album_index(embedding_file: str, index):
+    """Upload an updated index document to R2 and refresh the local cache."""
+    try:
+        embedding_cache.put(embedding_file, index)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to upload embeddings to R2: {e}")
+
+# --- API Endpoints ---
+
+@app.post("/add_embeddings_from_urls/", dependencies=[Depends(require_gateway)])
+async def add_embeddings_from_urls(urls: List[str] = Form(...), embedding_file: str = Form(...)):
+    if not facenet_model or not s3_client:
+        raise HTTPException(status_code=503, detail="A core service (ML model or Storage) is not available.")
+
+    cached = load_album_index(embedding_file)
+    index = cached.to_index() if cached else new_index()
+
+    # Photos already indexed by the current model are skipped rather than recomputed
+    pending_keys = {}
+    for url in urls:
+        object_key = object_key_from_url(url, R2_CONFIG["public_base_url"])
+        record = index["embeddings"].get(object_key)
+        if record is None or record.get("model") != embedding_model_version:
+            pending_keys[object_key] = url
+
+    new_embeddings = index_photos(pending_keys)
 
     if new_embeddings:
-        url_embedding_map.extend(new_embeddings)
-        with open(local_temp_path, 'w') as f:
-            json.dump(url_embedding_map, f, indent=4)
-        try:
-            s3_client.upload_file(local_temp_path, R2_CONFIG["bucket_name"], embedding_file)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload embeddings to R2: {e}")
-        finally:
-            if os.path.exists(local_temp_path):
-                os.remove(local_temp_path)
-    
-    return {"message": "Embeddings processed.", "added_count": len(new_embeddings)}
+        index["embeddings"].update(new_embeddings)
+        clustered = update_clusters(index, list(new_embeddings))
+        save_album_index(embedding_file, index)
+        if not clustered:
+            schedule_clustering(embedding_file)
+
+    # The album's most confidently detected faces, best first; the gateway uses
+    # them as cover candidates so a deleted cover falls back to the next best face
+    faces = [{"key": key, "confidence": record["confidence"]} for key, record in index["embeddings"].items()
+             if record.get("model") == embedding_model_version and record.get("confidence") is not None]
+    best_faces = heapq.nlargest(COVER_CANDIDATES, faces, key=lambda face: face["confidence"])
 
-@app.post("/find_similar_faces/")
+    return {"message": "Embeddings processed.", "added_count": len(new_embeddings), "best_faces": best_faces}
+
+@app.post("/find_similar_faces/", dependencies=[Depends(require_gateway)])
 async def find_similar_faces(file: UploadFile = File(...), embedding_file: str = Form(...), threshold: float = Form(0.55)):
     if not facenet_model or not s3_client:
         raise HTTPException(status_code=503, detail="A core service is not available.")
-    
-    local_temp_path = os.path.join(EMBEDDINGS_DIR, embedding_file)
-    
-    try:
-        s3_client.download_file(R2_CONFIG["bucket_name"], embedding_file, local_temp_path)
-    except ClientError as e:
-        if e.response['Error']['Code'] == '404':
-            return {"match_count": 0, "matches": [], "message": f"Album embeddings '{embedding_file}' not found."}
-        else:
-            raise HTTPException(status_code=500, detail=f"R2 download error: {e}")
-
-    with open(local_temp_path, 'r') as f:
-        url_embedding_map = json.load(f)
-    if os.path.exists(local_temp_path):
-        os.remove(local_temp_path)
-    
-    input_bytes = await file.read()
-    face_pixels = extract_face(input_bytes)
-    if face_pixels is None:
-        raise HTTPException(status_code=400, detail="No face detected in the uploaded image.")
 
-    input_embedding = get_embedding(face_pixels)
-    normalized_input_embedding = in_encoder.transform([input_embedding])[0]
+    cached = load_album_index(embedding_file)
+    if cached is None:
+        return {"match_count": 0, "matches": [], "message": f"Album embeddings '{embedding_file}' not found."}
 
-    results = []
-    for item in url_embedding_map:
-        similarity = 1 - distance.cosine(normalized_input_embedding, np.array(item["embedding"]))
-        if similarity > threshold:
-            results.append({"url": item["url"], "score": float(similarity)})
+    normalized_input_embedding = await query_embedding(file)
+
+    # URLs are resolved here so the public domain can change without reindexing
+    matches = [
+        {"url": object_url(key, R2_CONFIG["public_base_url"]), "score": score}
+        for key, score in scan_faces(cached, normalized_input_embedding, threshold)
+    ]
 
-    results.sort(key=lambda x: x["score"], reverse=True)
-    
     # --- FIX: Removed the [:10] slice to return all matches ---
-    return {"match_count": len(results), "matches": results}
+    return {"match_count": len(matches), "matches": matches}
 
 
-@app.post("/remove_embedding/")
-async def remove_embedding(embedding_file: str = Form(...), image_url: str = Form(...)):
+@app.post("/remove_embedding/", dependencies=[Depends(require_gateway)])
+async def remove_embedding(
+    embedding_file: str = Form(...),
+    object_keys: Optional[List[str]] = Form(None),
+    object_key: Optional[str] = Form(None),
+    image_url: Optional[str] = Form(None),
+):
+    """Remove the embeddings of deleted photos with a single update of the album's index."""
     if not s3_client:
         raise HTTPException(status_code=503, detail="Storage service not available.")
-        
-    local_temp_path = os.path.join(EMBEDDINGS_DIR, embedding_file)
-    url_embedding_map = []
-    
+    keys = list(object_keys or [])
+    if object_key:
+        keys.append(object_key)
+    if image_url:
+        keys.append(object_key_from_url(image_url, R2_CONFIG["public_base_url"]))
+    if not keys:
+        raise HTTPException(status_code=422, detail="Either object_keys, object_key or image_url is required.")
+
     try:
-        s3_client.download_file(R2_CONFIG["bucket_name"], embedding_file, local_temp_path)
-        with open(local_temp_path, 'r') as f:
-            url_embedding_map = json.load(f)
+        cached = embedding_cache.get(embedding_file)
     except ClientError:
-        return {"message": "Embedding file not found, nothing to remove."}
+        cached = None
+    if cached is None:
+        return {"message": "Embedding file not found, nothing to remove.", "removed_count": 0}
 
-    original_count = len(url_embedding_map)
-    updated_embedding_map = [item for item in url_embedding_map if item.get("url") != image_url]
-    
-    if len(updated_embedding_map) == original_count:
-        if os.path.exists(local_temp_path): os.remove(local_temp_path)
-        return {"message": "Image URL not found in embeddings, no changes made."}
+    removed = [key for key in dict.fromkeys(keys) if key in cached.records]
+    if not removed:
+        return {"message": "Images not found in embeddings, no changes made.", "removed_count": 0}
+    index = cached.to_index()
+    for key in removed:
+        del index["embeddings"][key]
+        if "clusters" in index:
+            remove_member(index["clusters"], key, index["embeddings"])
 
-    with open(local_temp_path, 'w') as f:
-        json.dump(updated_embedding_map, f, indent=4)
-    try:
-        s3_client.upload_file(local_temp_path, R2_CONFIG["bucket_name"], embedding_file)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to upload updated embeddings to R2: {e}")
-    finally:
-        if os.path.exists(local_temp_path):
-            os.remove(local_temp_path)
-        
-    return {"message": f"Successfully removed embedding for {image_url}."}
+    save_album_index(embedding_file, index)
+
+    return {"message": f"Successfully removed {len(removed)} embedding(s).", "removed_count": len(removed)}
+
+@app.post("/find_person/", dependencies=[Depends(require_gateway)])
+async def find_person(file: UploadFile = File(...), embedding_file: str = Form(...), threshold: float = Form(0.55)):
+    """Match the query face against the album's people and return all of their photos."""
+    if not facenet_model or not s3_client:
+        raise HTTPException(status_code=503, detail="A core service is not available.")
+
+    cached = load_album_index(embedding_file)
+    if cached is None:
+        return {"match_count": 0, "matches": [], "people": [], "message": f"Album embeddings '{embedding_file}' not found."}
+    clusters = album_clusters(embedding_file, cached)
+
+    normalized_input_embedding = await query_embedding(file)
+
+    if clusters is None:
+        # Not grouped into people yet: fall back to matching individual faces
+        matches = [
+            {"url": object_url(key, R2_CONFIG["public_base_url"]), "score": score, "person": None}
+            for key, score in scan_faces(cached, normalized_input_embedding, threshold)
+        ]
+        return {"match_count": len(matches), "matches": matches, "people": [],
+                "message": "People in this album are still being grouped."}
+
+    with timed(SIMILARITY_SCAN_LATENCY, "similarity_scan"):
+        matched = match_clusters(normalized_input_embedding, clusters, threshold)
+
+    matches, seen = [], set()
+    for cluster, score in matched:
+        for object_key in cluster["members"]:
+            if object_key not in seen:
+                seen.add(object_key)
+                matches.append({"url": object_url(object_key, R2_CONFIG["public_base_url"]), "score": score, "person": cluster["id"]})
+
+    people = [{"person": cluster["id"], "score": score, "photo_count": len(cluster["members"])} for cluster, score in matched]
+    return {"match_count": len(matches), "matches": matches, "people": people}
+
+
+@app.post("/album_people/", dependencies=[Depends(require_gateway)])
+async def album_people(embedding_file: str = Form(...)):
+    """List the people found in an album with a representative photo for each."""
+    if not s3_client:
+        raise HTTPException(status_code=503, detail="Storage service not available.")
+
+    cached = load_album_index(embedding_file)
+    if cached is None:
+        return {"people": [], "message": f"Album embeddings '{embedding_file}' not found."}
+
+    clusters = album_clusters(embedding_file, cached)
+    if clusters is None:
+        return {"people": [], "message": "People in this album are still being grouped."}
+
+    base_url = R2_CONFIG["public_base_url"]
+    people = [
+        {
+            "person": cluster["id"],
+            "photo_count": len(cluster["members"]),
+            "cover": object_url(cluster["members"][0], base_url),
+            "photos": [object_url(key, base_url) for key in cluster["members"]],
+        }
+        for cluster in clusters
+    ]
+    return {"people": people}
+
+
+@app.post("/reindex/", dependencies=[Depends(require_admin)])
+def start_reindex():
+    """Start migrating every album's stale embeddings to the running model version."""
+    if not reindexer:
+        raise HTTPException(status_code=503, detail="A core service is not available.")
+    started = reindexer.start()
+    return {"started": started, **reindexer.status()}
+
+@app.get("/reindex/")
+def reindex_status():
+    if not reindexer:
+        raise HTTPException(status_code=503, detail="A core service is not available.")
+    return reindexer.status()
+
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/")
 def root():
-    return {"status": "✅ API Running", "model_loaded": facenet_model is not None}
+    return {"status": "✅ API Running", "model_loaded": facenet_model is not None, "model_version": embedding_model_version}
 
 if __name__ == "__main__":
     uvicorn.run("main_fastapi:app", host="0.0.0.0", port=8080, reload=True)
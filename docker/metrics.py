@@ -0,0 +1,134 @@
+# metrics.py
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST,
+)
+
+# With several uvicorn workers, each process writes its samples under this
+# directory and a scrape aggregates all of them. It must exist and be empty
+# when the service starts (see the Dockerfile).
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# --- Metric Definitions ---
+REQUEST_LATENCY = Histogram(
+    "ml_request_seconds",
+    "Time spent handling ML API HTTP requests",
+    ["method", "endpoint", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "ml_requests_in_flight",
+    "ML API HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+R2_LATENCY = Histogram(
+    "ml_r2_request_seconds",
+    "Latency of Cloudflare R2 calls made by the ML API",
+    ["operation"],
+)
+EMBEDDINGS_LOAD_LATENCY = Histogram(
+    "ml_embeddings_load_seconds",
+    "Time spent downloading and parsing album embedding files",
+    ["phase"],
+)
+EMBEDDINGS_CACHE_EVENTS = Counter(
+    "ml_embeddings_cache_events_total",
+    "Local embedding cache lookups by outcome (hit, miss, absent), evictions and orphaned files removed",
+    ["event"],
+)
+IMAGE_FETCH_LATENCY = Histogram(
+    "ml_image_fetch_seconds",
+    "Time spent downloading photos to index",
+)
+DECODE_LATENCY = Histogram(
+    "ml_image_decode_seconds",
+    "Time spent decoding photos before face detection",
+)
+DETECTION_LATENCY = Histogram(
+    "ml_mtcnn_detection_seconds",
+    "Time spent in MTCNN face detection per image",
+)
+INFERENCE_LATENCY = Histogram(
+    "ml_facenet_inference_seconds",
+    "Time spent in FaceNet inference per call",
+)
+SIMILARITY_SCAN_LATENCY = Histogram(
+    "ml_similarity_scan_seconds",
+    "Time spent scanning an album's embeddings for matches",
+)
+CLUSTERING_LATENCY = Histogram(
+    "ml_clustering_seconds",
+    "Time spent clustering an album's faces into people",
+)
+INDEXING_QUEUE_DEPTH = Gauge(
+    "ml_indexing_queue_depth",
+    "Photos submitted for indexing that have not finished processing",
+    multiprocess_mode="livesum",
+)
+
+# Header a client sends to get the per-stage breakdown back in `Server-Timing`
+TIMING_REQUEST_HEADER = "X-Request-Timing"
+
+# Per-request list of (stage, seconds); None outside of a request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timing():
+    """Begin collecting a stage breakdown for the current request."""
+    return _request_timings.set([])
+
+
+def reset_request_timing(token):
+    """Stop collecting the breakdown started by `start_request_timing`."""
+    _request_timings.reset(token)
+
+
+def get_request_timings():
+    """Return the (stage, seconds) pairs recorded for the current request."""
+    return list(_request_timings.get() or [])
+
+
+def record_stage(stage, seconds):
+    """Add a stage duration to the current request breakdown, if one is active."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(histogram, stage, **labels):
+    """Time a block, observe it on `histogram` and record it as `stage`.
+
+    Stages timed on executor threads only reach the histogram, since those
+    threads do not share the request context.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        record_stage(stage, elapsed)
+
+
+def format_server_timing(timings):
+    """Format (stage, seconds) pairs as a `Server-Timing` header value."""
+    totals = {}
+    for stage, seconds in timings:
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + 1)
+    return ", ".join(
+        f'{stage};dur={total * 1000:.1f};desc="x{count}"'
+        for stage, (total, count) in totals.items()
+    )
+
+
+def render_metrics():
+    """Return (body, content_type) for a Prometheus scrape, summed over all workers."""
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,61 @@
+# preprocess.py
+import io
+import numpy as np
+from PIL import Image, ImageOps
+
+from metrics import timed, DECODE_LATENCY, DETECTION_LATENCY
+
+FACE_SIZE = (160, 160)  # FaceNet input size
+# JPEGs are decoded at a reduced scale (1/2, 1/4 or 1/8) while both sides
+# stay at or above this, which is plenty for MTCNN and much cheaper than a
+# full-resolution decode of a phone or DSLR photo.
+DETECTION_MIN_SIDE = 1280
+# Recorded with every embedding; bump when detection or cropping changes
+DETECTOR_VERSION = f"mtcnn-0.1.1/draft{DETECTION_MIN_SIDE}"
+
+
+def new_face_batch(size: int) -> np.ndarray:
+    """Allocate a batch buffer that face crops are written into."""
+    return np.empty((size, FACE_SIZE[1], FACE_SIZE[0], 3), dtype="float32")
+
+
+def decode_image(image_bytes: bytes) -> Image.Image:
+    """Decode a photo upright, at the smallest JPEG scale usable for detection."""
+    with timed(DECODE_LATENCY, "image_decode"):
+        image = Image.open(io.BytesIO(image_bytes))
+        # No-op for formats other than JPEG
+        image.draft("RGB", (DETECTION_MIN_SIDE, DETECTION_MIN_SIDE))
+        # Rotate phone photos according to their EXIF orientation tag
+        ImageOps.exif_transpose(image, in_place=True)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.load()
+    return image
+
+
+def locate_face(image: Image.Image, detector):
+    """Return ((x1, y1, x2, y2), confidence) of the first detected face, or None."""
+    with timed(DETECTION_LATENCY, "mtcnn_detect"):
+        results = detector.detect_faces(np.asarray(image))
+    if not results:
+        return None
+    x1, y1, width, height = results[0]["box"]
+    x1, y1 = abs(x1), abs(y1)
+    box = (x1, y1, min(x1 + width, image.width), min(y1 + height, image.height))
+    return box, float(results[0]["confidence"])
+
+
+def write_face(image: Image.Image, box, out: np.ndarray):
+    """Crop, resize and standardize a face straight into `out`.
+
+    Args:
+        image: Decoded RGB photo
+        box: Face box (x1, y1, x2, y2) in image coordinates
+        out: Float32 slot of shape (160, 160, 3), typically a row of new_face_batch()
+    """
+    # Crop and resize in one resampling pass, without an intermediate crop image
+    face = image.resize(FACE_SIZE, box=box)
+    out[...] = np.asarray(face)
+    mean, std = out.mean(), out.std()
+    out -= mean
+    out /= std
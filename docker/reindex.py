@@ -0,0 +1,225 @@
+# reindex.py
+import os
+import json
+import fcntl
+import shutil
+import threading
+import traceback
+
+from embedding_index import object_url
+
+EMBEDDING_FILE_SUFFIX = "_embeddings.json"
+REINDEX_CHUNK_SIZE = 256  # Stale photos recomputed between checkpoints
+
+
+class Reindexer:
+    """Background migration of album indexes to the current model version.
+
+    Walks every `<album>_embeddings.json` in the bucket and recomputes only
+    the records whose `model` differs from the running model version. Each
+    chunk's results are written to their own file next to the checkpoint,
+    which only records how many chunks are done, so an interrupted run
+    resumes where it stopped without rewriting earlier results. Each album is
+    swapped in with a single object PUT once all of its stale records are
+    recomputed, so searches never see a half-migrated index.
+
+    Progress is written to a status file and the run holds a file lock, so
+    any worker on the node can report on a run started by another.
+    """
+
+    def __init__(self, s3_client, embedding_cache, bucket, public_base_url,
+                 index_photos, refresh_clusters, model_version, checkpoint_path):
+        self.s3 = s3_client
+        self.cache = embedding_cache
+        self.bucket = bucket
+        self.public_base_url = public_base_url
+        self.index_photos = index_photos
+        self.refresh_clusters = refresh_clusters
+        self.model_version = model_version
+        self.checkpoint_path = checkpoint_path
+        self.chunk_dir = f"{checkpoint_path}.chunks"
+        self.status_path = f"{checkpoint_path}.status.json"
+        self.lock_path = f"{checkpoint_path}.lock"
+        self._thread = None
+        self._lock = threading.Lock()
+        self.progress = {"running": False, "model": model_version, "albums_total": 0,
+                         "albums_done": 0, "current_album": None, "photos_reindexed": 0,
+                         "photos_dropped": 0, "error": None}
+
+    def start(self):
+        """Start a run in a background thread. Returns False if one is already running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, name="reindexer", daemon=True)
+            self.progress.update(running=True, error=None)
+            self._thread.start()
+            return True
+
+    def status(self):
+        """Progress of the latest run on this node, whichever worker started it."""
+        try:
+            with open(self.status_path, "r") as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            status = dict(self.progress)
+        # The status file outlives a crashed run; the lock does not
+        status["running"] = bool(self._thread and self._thread.is_alive()) or self._lock_held()
+        return status
+
+    def _lock_held(self):
+        """True if a run holds the node-wide lock."""
+        try:
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        return False
+
+    def _update_progress(self, **changes):
+        self.progress.update(changes)
+        self._write_json(self.status_path, self.progress)
+
+    # --- Run loop ---
+
+    def _run(self):
+        # Only one worker process on the node may migrate at a time
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            self.progress.update(running=False, error="A re-index is already running in another worker.")
+            return
+        try:
+            checkpoint = self._load_checkpoint()
+            embedding_files = self._list_embedding_files()
+            self._update_progress(running=True, error=None, photos_reindexed=0, photos_dropped=0,
+                                  albums_total=len(embedding_files), albums_done=len(checkpoint["completed"]))
+            for embedding_file in embedding_files:
+                if embedding_file in checkpoint["completed"]:
+                    continue
+                self._update_progress(current_album=embedding_file)
+                self._reindex_album(embedding_file, checkpoint)
+                checkpoint["completed"].append(embedding_file)
+                checkpoint["current"] = None
+                self._save_checkpoint(checkpoint)
+                self._clear_chunks()
+                self._update_progress(albums_done=self.progress["albums_done"] + 1)
+            # Every album is migrated; the next run starts from scratch
+            self._clear_checkpoint()
+        except Exception as e:
+            traceback.print_exc()
+            self.progress["error"] = str(e)
+        finally:
+            self._update_progress(running=False, current_album=None)
+            lock_file.close()
+
+    def _list_embedding_files(self):
+        paginator = self.s3.get_paginator("list_objects_v2")
+        files = []
+        # Embedding files sit at the bucket root; the delimiter skips every photo under a user prefix
+        for page in paginator.paginate(Bucket=self.bucket, Delimiter="/"):
+            files.extend(item["Key"] for item in page.get("Contents", [])
+                         if item["Key"].endswith(EMBEDDING_FILE_SUFFIX) and "/" not in item["Key"])
+        return sorted(files)
+
+    def _reindex_album(self, embedding_file, checkpoint):
+        cached = self.cache.get(embedding_file)
+        if cached is None:
+            return
+        stale = [key for key, record in cached.records.items() if record.get("model") != self.model_version]
+        if not stale:
+            return
+
+        # Resume records computed before an interruption
+        current = checkpoint.get("current")
+        if not current or current["file"] != embedding_file or "chunks" not in current:
+            self._clear_chunks()
+            current = checkpoint["current"] = {"file": embedding_file, "chunks": 0}
+        records, processed = {}, set()
+        for number in range(current["chunks"]):
+            chunk_result = self._load_chunk(number)
+            records.update(chunk_result["records"])
+            processed.update(chunk_result["processed"])
+        remaining = [key for key in stale if key not in processed]
+
+        for start in range(0, len(remaining), REINDEX_CHUNK_SIZE):
+            chunk = remaining[start:start + REINDEX_CHUNK_SIZE]
+            pending = {key: object_url(key, self.public_base_url) for key in chunk}
+            chunk_records = self.index_photos(pending)
+            records.update(chunk_records)
+            # Only this chunk is written; the checkpoint just counts finished chunks
+            self._write_json(self._chunk_path(current["chunks"]), {"processed": chunk, "records": chunk_records})
+            current["chunks"] += 1
+            self._save_checkpoint(checkpoint)
+            self._update_progress(photos_reindexed=self.progress["photos_reindexed"] + len(chunk))
+
+        # Give photos that failed (e.g. a download error) one more try before they are dropped
+        failed = [key for key in stale if key not in records]
+        if failed:
+            records.update(self.index_photos({key: object_url(key, self.public_base_url) for key in failed}))
+        self._swap_in(embedding_file, records)
+
+    def _swap_in(self, embedding_file, new_records):
+        """Merge recomputed records into the latest index and upload it in one PUT.
+
+        Photos that still could not be reprocessed (gone from storage, no face
+        found by the new detector) are dropped: searches ignore embeddings
+        from other models, so a stale record would never match again.
+        """
+        # Re-read just before writing so photos added or removed meanwhile are kept
+        latest = self.cache.get(embedding_file)
+        if latest is None:
+            return
+        index = latest.to_index()
+        for key, record in new_records.items():
+            if key in index["embeddings"]:
+                index["embeddings"][key] = record
+        dropped = [key for key, record in index["embeddings"].items() if record.get("model") != self.model_version]
+        for key in dropped:
+            del index["embeddings"][key]
+        self.refresh_clusters(index)
+        self.cache.put(embedding_file, index)
+        self._update_progress(photos_dropped=self.progress["photos_dropped"] + len(dropped))
+
+    # --- Checkpoints ---
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("model") == self.model_version:
+                return checkpoint
+        except (OSError, ValueError):
+            pass
+        return {"model": self.model_version, "completed": [], "current": None}
+
+    def _save_checkpoint(self, checkpoint):
+        self._write_json(self.checkpoint_path, checkpoint)
+
+    def _clear_checkpoint(self):
+        self._clear_chunks()
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    def _chunk_path(self, number):
+        return os.path.join(self.chunk_dir, f"{number:06d}.json")
+
+    def _load_chunk(self, number):
+        with open(self._chunk_path(number), "r") as f:
+            return json.load(f)
+
+    def _clear_chunks(self):
+        shutil.rmtree(self.chunk_dir, ignore_errors=True)
+
+    @staticmethod
+    def _write_json(path, data):
+        """Write a JSON file atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,66 @@
+# conftest.py
+# The ML service's modules import each other by bare name (they are copied
+# flat into the image), so tests import them from the docker directory.
+# Run these tests from docker/: `cd docker && python -m pytest`.
+import io
+import os
+import sys
+import json
+import hashlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+
+class StubS3:
+    """In-memory stand-in for the boto3 S3 client, recording every get_object call."""
+
+    def __init__(self):
+        self.objects = {}  # {key: (body, etag)}
+        self.gets = []  # (key, If-None-Match or None, status)
+        self.list_delimiters = []
+
+    def store(self, key, index):
+        body = json.dumps(index).encode()
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        self.objects[key] = (body, etag)
+        return etag
+
+    def load(self, key):
+        return json.loads(self.objects[key][0])
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        if Key not in self.objects:
+            self.gets.append((Key, IfNoneMatch, 404))
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        body, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            self.gets.append((Key, IfNoneMatch, 304))
+            raise ClientError({"Error": {"Code": "304"}}, "GetObject")
+        self.gets.append((Key, IfNoneMatch, 200))
+        return {"Body": io.BytesIO(body), "ETag": etag}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = (Body, '"%s"' % hashlib.md5(Body).hexdigest())
+        return {"ETag": self.objects[Key][1]}
+
+    def get_paginator(self, operation):
+        stub = self
+
+        class Paginator:
+            def paginate(self, Bucket, Delimiter=None):
+                stub.list_delimiters.append(Delimiter)
+                keys = sorted(stub.objects)
+                if Delimiter:
+                    keys = [key for key in keys if Delimiter not in key]
+                return [{"Contents": [{"Key": key} for key in keys]}]
+
+        return Paginator()
+
+
+@pytest.fixture
+def s3():
+    return StubS3()
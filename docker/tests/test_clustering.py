@@ -0,0 +1,134 @@
+# test_clustering.py
+import numpy as np
+import pytest
+
+import clustering
+from clustering import cluster_embeddings, add_members, remove_member, match_clusters, _stable_ids, _similarity_graph
+
+DIMENSIONS = 128
+
+
+@pytest.fixture
+def people():
+    """Return a function making L2-normalized faces of a few distinct people."""
+    rng = np.random.default_rng(7)
+    identities = rng.normal(size=(4, DIMENSIONS))
+
+    def faces(person, count):
+        vectors = identities[person] + 0.05 * rng.normal(size=(count, DIMENSIONS))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32")
+
+    return faces
+
+
+def records(keys, matrix):
+    return {key: {"embedding": row.tolist()} for key, row in zip(keys, matrix)}
+
+
+def members(clusters):
+    return {cluster["id"]: sorted(cluster["members"]) for cluster in clusters}
+
+
+def test_faces_are_grouped_by_person_largest_first(people):
+    matrix = np.vstack([people(0, 2), people(1, 4)])
+    keys = ["a0", "a1", "b0", "b1", "b2", "b3"]
+
+    clusters = cluster_embeddings(keys, matrix)
+
+    assert members(clusters) == {0: ["b0", "b1", "b2", "b3"], 1: ["a0", "a1"]}
+    for cluster in clusters:
+        assert np.linalg.norm(cluster["centroid"]) == pytest.approx(1.0)
+
+
+def test_empty_album_has_no_clusters():
+    assert cluster_embeddings([], np.zeros((0, DIMENSIONS), dtype="float32")) == []
+
+
+def test_person_ids_survive_a_recluster(people):
+    keys = ["a0", "a1", "a2", "b0"]
+    first = cluster_embeddings(keys, np.vstack([people(0, 3), people(1, 1)]))
+    a_id = next(c["id"] for c in first if "a0" in c["members"])
+    b_id = next(c["id"] for c in first if "b0" in c["members"])
+
+    # Person b now has the most photos, which used to renumber everyone
+    keys += ["b1", "b2", "b3", "b4", "c0"]
+    matrix = np.vstack([people(0, 3), people(1, 1), people(1, 4), people(2, 1)])
+    second = cluster_embeddings(keys, matrix, previous=first)
+
+    ids = {c["members"][0][0]: c["id"] for c in second}
+    assert ids["a"] == a_id and ids["b"] == b_id
+    assert ids["c"] == max(a_id, b_id) + 1
+    assert second[0]["id"] == b_id  # Still ordered largest first
+
+
+def test_stable_ids_never_reuse_a_vanished_id():
+    previous = [{"id": 0, "centroid": [1.0, 0.0]}, {"id": 5, "centroid": [0.0, 1.0]}]
+    centroids = np.array([[0.0, 1.0], [-1.0, 0.0]])
+    assert _stable_ids(centroids, previous, 0.55) == [5, 6]
+
+
+def test_stable_ids_match_each_previous_cluster_once():
+    previous = [{"id": 3, "centroid": [1.0, 0.0]}]
+    centroids = np.array([[0.9, 0.436], [1.0, 0.0]])
+    assert _stable_ids(centroids, previous, 0.55) == [4, 3]
+
+
+def test_similarity_graph_keeps_the_strongest_links(people):
+    matrix = people(0, 10)
+    indptr, neighbours, weights = _similarity_graph(matrix, 0.55, max_neighbours=3)
+
+    assert np.diff(indptr).tolist() == [3] * 10
+    assert not any(neighbours[indptr[i]:indptr[i + 1]].tolist().count(i) for i in range(10))
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -1)
+    assert sorted(weights[:3].tolist()) == pytest.approx(sorted(np.sort(sims[0])[-3:].tolist()))
+
+
+def test_similarity_graph_is_chunked(people, monkeypatch):
+    monkeypatch.setattr(clustering, "SIMILARITY_CHUNK_ROWS", 3)
+    matrix = np.vstack([people(0, 4), people(1, 4)])
+    assert members(cluster_embeddings(list("aaaabbbb"), matrix)) == {0: list("aaaa"), 1: list("bbbb")}
+
+
+def test_remove_member_recomputes_centroid_and_drops_empty_clusters(people):
+    keys = ["a0", "a1", "b0"]
+    matrix = np.vstack([people(0, 2), people(1, 1)])
+    embeddings = records(keys, matrix)
+    clusters = cluster_embeddings(keys, matrix)
+
+    del embeddings["a1"]
+    remove_member(clusters, "a1", embeddings)
+    a_cluster = next(c for c in clusters if "a0" in c["members"])
+    assert a_cluster["members"] == ["a0"]
+    assert a_cluster["centroid"] == pytest.approx(embeddings["a0"]["embedding"], abs=1e-6)
+
+    del embeddings["b0"]
+    remove_member(clusters, "b0", embeddings)
+    assert [c["members"] for c in clusters] == [["a0"]]
+
+
+def test_add_members_joins_known_people_and_creates_new_ones(people):
+    keys = ["a0", "a1", "b0"]
+    matrix = np.vstack([people(0, 2), people(1, 1)])
+    clusters = cluster_embeddings(keys, matrix)
+    ids_before = {c["members"][0][0]: c["id"] for c in clusters}
+
+    new_keys = ["b1", "b2", "c0", "c1"]
+    new_matrix = np.vstack([people(1, 2), people(2, 2)])
+    embeddings = records(keys + new_keys, np.vstack([matrix, new_matrix]))
+    add_members(clusters, new_keys, new_matrix, embeddings)
+
+    by_person = {c["members"][0][0]: c for c in clusters}
+    assert sorted(by_person["b"]["members"]) == ["b0", "b1", "b2"]
+    assert by_person["b"]["id"] == ids_before["b"]
+    assert sorted(by_person["c"]["members"]) == ["c0", "c1"]
+    assert by_person["c"]["id"] == max(ids_before.values()) + 1
+    assert clusters[0] is by_person["b"]
+
+
+def test_match_clusters_orders_by_score(people):
+    keys = ["a0", "b0", "b1"]
+    clusters = cluster_embeddings(keys, np.vstack([people(0, 1), people(1, 2)]))
+    query = people(0, 1)[0]
+    matched = match_clusters(query, clusters)
+    assert [c["members"] for c, _ in matched] == [["a0"]]
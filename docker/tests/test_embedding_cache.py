@@ -0,0 +1,137 @@
+# test_embedding_cache.py
+import os
+import time
+
+from embedding_cache import EmbeddingCache, META_SUFFIX
+
+BUCKET = "bucket"
+BASE_URL = "https://cdn.example.com"
+
+
+def make_index(*keys, value=0.5):
+    return {
+        "version": 2,
+        "embeddings": {key: {"embedding": [value, float(i), 0.0, 1.0], "model": "m"} for i, key in enumerate(keys)},
+    }
+
+
+def new_cache(s3, cache_dir, max_bytes=10 ** 9, **kwargs):
+    return EmbeddingCache(s3, BUCKET, BASE_URL, str(cache_dir), max_bytes, **kwargs)
+
+
+def test_miss_then_revalidated_hit(s3, tmp_path):
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg", "u/a/2.jpg"))
+    cache = new_cache(s3, tmp_path)
+
+    first = cache.get("a_embeddings.json")
+    second = cache.get("a_embeddings.json")
+
+    assert first.keys == ["u/a/1.jpg", "u/a/2.jpg"]
+    assert second is first
+    etag = s3.objects["a_embeddings.json"][1]
+    assert s3.gets == [("a_embeddings.json", None, 200), ("a_embeddings.json", etag, 304)]
+
+
+def test_other_worker_revalidates_from_disk(s3, tmp_path):
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg"))
+    new_cache(s3, tmp_path).get("a_embeddings.json")
+
+    cached = new_cache(s3, tmp_path).get("a_embeddings.json")
+
+    assert s3.gets[-1][2] == 304
+    assert cached.matrix[0].tolist() == [0.5, 0.0, 0.0, 1.0]
+
+
+def test_changed_object_is_downloaded_again(s3, tmp_path):
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg"))
+    cache = new_cache(s3, tmp_path)
+    cache.get("a_embeddings.json")
+
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg", "u/a/3.jpg", value=0.25))
+    cached = cache.get("a_embeddings.json")
+
+    assert s3.gets[-1][2] == 200
+    assert cached.keys == ["u/a/1.jpg", "u/a/3.jpg"]
+    assert cached.matrix[0, 0] == 0.25
+    # Only the current version's matrix is left on disk
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".npy")]) == 1
+
+
+def test_missing_object_returns_none_and_drops_entry(s3, tmp_path):
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg"))
+    cache = new_cache(s3, tmp_path)
+    cache.get("a_embeddings.json")
+
+    del s3.objects["a_embeddings.json"]
+
+    assert cache.get("a_embeddings.json") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_evicted_matrix_is_refetched(s3, tmp_path):
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg"))
+    new_cache(s3, tmp_path).get("a_embeddings.json")
+    for name in os.listdir(tmp_path):
+        if name.endswith(".npy"):
+            os.remove(os.path.join(tmp_path, name))
+
+    cached = new_cache(s3, tmp_path).get("a_embeddings.json")
+
+    # A 304 for metadata whose matrix is gone falls back to a full download
+    assert [status for _, _, status in s3.gets] == [200, 304, 200]
+    assert cached.matrix[0].tolist() == [0.5, 0.0, 0.0, 1.0]
+
+
+def test_least_recently_used_album_is_evicted(s3, tmp_path):
+    for album in ("a", "b", "c"):
+        s3.store(f"{album}_embeddings.json", make_index(f"u/{album}/1.jpg"))
+    cache = new_cache(s3, tmp_path)
+    cache.get("a_embeddings.json")
+    entry_size = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+    cache.max_bytes = int(entry_size * 2.5)
+
+    time.sleep(0.01)
+    cache.get("b_embeddings.json")
+    time.sleep(0.01)
+    cache.get("a_embeddings.json")  # Revalidation marks "a" as recently used
+    time.sleep(0.01)
+    cache.get("c_embeddings.json")
+
+    cached_albums = sorted(name[:-len(META_SUFFIX)] for name in os.listdir(tmp_path) if name.endswith(META_SUFFIX))
+    assert cached_albums == ["a_embeddings.json", "c_embeddings.json"]
+
+
+def test_mappings_are_bounded_and_dropped_when_replaced(s3, tmp_path):
+    for album in ("a", "b", "c"):
+        s3.store(f"{album}_embeddings.json", make_index(f"u/{album}/1.jpg"))
+    worker = new_cache(s3, tmp_path, max_opened=2)
+    for album in ("a", "b", "c"):
+        worker.get(f"{album}_embeddings.json")
+    assert list(worker._opened) == ["b_embeddings.json", "c_embeddings.json"]
+
+    # Another worker stores a new version of "b", unlinking the matrix mapped here
+    new_cache(s3, tmp_path).put("b_embeddings.json", make_index("u/b/1.jpg", "u/b/2.jpg"))
+    cached = worker.get("b_embeddings.json")
+
+    assert cached.keys == ["u/b/1.jpg", "u/b/2.jpg"]
+    assert s3.gets[-1][2] == 304  # Served from the other worker's files, not downloaded
+
+
+def test_eviction_sweeps_orphaned_matrices_and_temp_files(s3, tmp_path):
+    s3.store("a_embeddings.json", make_index("u/a/1.jpg"))
+    stale_matrix = tmp_path / "a_embeddings.json.0123456789ab.npy"
+    crashed_write = tmp_path / "b_embeddings.json.meta.json.42.tmp"
+    fresh_write = tmp_path / "c_embeddings.json.fedcba987654.npy.43.tmp"
+    for path in (stale_matrix, crashed_write, fresh_write):
+        path.write_bytes(b"x" * 100)
+    hour_ago = time.time() - 3600
+    for path in (stale_matrix, crashed_write):
+        os.utime(path, (hour_ago, hour_ago))
+
+    new_cache(s3, tmp_path).get("a_embeddings.json")
+
+    remaining = os.listdir(tmp_path)
+    assert stale_matrix.name not in remaining and crashed_write.name not in remaining
+    # Possibly another worker's write in progress
+    assert fresh_write.name in remaining
+    assert len([name for name in remaining if name.endswith(".npy")]) == 1
@@ -0,0 +1,45 @@
+# test_embedding_index.py
+import pytest
+
+from embedding_index import load_index, new_index, object_key_from_url, object_url, INDEX_FORMAT_VERSION
+
+BASE_URL = "https://cdn.example.com"
+
+
+def test_version_1_list_is_converted_to_keyed_records():
+    v1 = [
+        {"url": f"{BASE_URL}/alice/wedding/1.jpg", "embedding": [0.1, 0.2]},
+        {"url": f"{BASE_URL}/alice/wedding/2.jpg", "embedding": [0.3, 0.4]},
+    ]
+
+    index = load_index(v1, BASE_URL)
+
+    assert index["version"] == INDEX_FORMAT_VERSION
+    assert index["embeddings"] == {
+        "alice/wedding/1.jpg": {"embedding": [0.1, 0.2]},
+        "alice/wedding/2.jpg": {"embedding": [0.3, 0.4]},
+    }
+    # No model tag: converted records count as stale for re-indexing
+    assert all("model" not in record for record in index["embeddings"].values())
+
+
+def test_version_1_urls_on_an_old_domain_map_to_their_path():
+    index = load_index([{"url": "https://old-bucket.r2.dev/bob/trip/3.jpg", "embedding": [1.0]}], BASE_URL)
+    assert list(index["embeddings"]) == ["bob/trip/3.jpg"]
+
+
+def test_version_2_document_is_returned_unchanged():
+    v2 = {"version": 2, "embeddings": {"a/b/1.jpg": {"embedding": [1.0], "model": "m"}}, "clusters": []}
+    assert load_index(v2, BASE_URL) is v2
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError):
+        load_index({"version": 3, "embeddings": {}}, BASE_URL)
+
+
+def test_key_and_url_round_trip():
+    url = object_url("alice/wedding/1.jpg", BASE_URL + "/")
+    assert url == f"{BASE_URL}/alice/wedding/1.jpg"
+    assert object_key_from_url(url, BASE_URL) == "alice/wedding/1.jpg"
+    assert new_index() == {"version": INDEX_FORMAT_VERSION, "embeddings": {}}
@@ -0,0 +1,124 @@
+# test_reindex.py
+import os
+
+import pytest
+
+import reindex
+from embedding_cache import EmbeddingCache
+from reindex import Reindexer
+
+BASE_URL = "https://cdn.example.com"
+ALBUM = "wedding_embeddings.json"
+OLD, NEW = "facenet-old", "facenet-new"
+
+
+def record(model, value=0.0):
+    return {"embedding": [value, 1.0], "model": model}
+
+
+class FakeIndexer:
+    """Stands in for index_photos: returns NEW records, except for photos it fails on."""
+
+    def __init__(self, fail_on=(), crash_on_call=None, on_call=None):
+        self.fail_on = set(fail_on)
+        self.crash_on_call = crash_on_call
+        self.on_call = on_call
+        self.calls = []
+
+    def __call__(self, pending):
+        self.calls.append(sorted(pending))
+        if self.on_call:
+            self.on_call(len(self.calls))
+        if len(self.calls) == self.crash_on_call:
+            raise RuntimeError("worker killed")
+        assert all(url == f"{BASE_URL}/{key}" for key, url in pending.items())
+        return {key: record(NEW, 1.0) for key in pending if key not in self.fail_on}
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(reindex, "REINDEX_CHUNK_SIZE", 2)
+
+
+@pytest.fixture
+def album(s3):
+    keys = [f"alice/wedding/{i}.jpg" for i in range(5)]
+    s3.store(ALBUM, {"version": 2, "embeddings": {key: record(OLD) for key in keys}})
+    s3.store("alice/wedding/0.jpg", {})  # A photo: must not be listed as an embedding file
+    return keys
+
+
+def make_reindexer(s3, tmp_path, indexer):
+    cache = EmbeddingCache(s3, "bucket", BASE_URL, str(tmp_path / "cache"), 10 ** 9)
+    return Reindexer(s3, cache, "bucket", BASE_URL, indexer, lambda index: index.update(clusters=[]),
+                     NEW, str(tmp_path / "checkpoint.json"))
+
+
+def run(reindexer):
+    assert reindexer.start()
+    reindexer._thread.join()
+    return reindexer.status()
+
+
+def test_all_stale_records_are_recomputed_in_chunks(s3, tmp_path, album):
+    indexer = FakeIndexer()
+    status = run(make_reindexer(s3, tmp_path, indexer))
+
+    assert [len(call) for call in indexer.calls] == [2, 2, 1]
+    assert {r["model"] for r in s3.load(ALBUM)["embeddings"].values()} == {NEW}
+    assert status["albums_done"] == 1 and status["photos_reindexed"] == 5 and not status["running"]
+    # Listing only asks for the bucket root
+    assert s3.list_delimiters == ["/"]
+    assert not os.path.exists(tmp_path / "checkpoint.json")
+    assert not os.path.exists(tmp_path / "checkpoint.json.chunks")
+
+
+def test_interrupted_run_resumes_from_chunk_files(s3, tmp_path, album):
+    crashed = make_reindexer(s3, tmp_path, FakeIndexer(crash_on_call=2))
+    status = run(crashed)
+    assert status["error"] == "worker killed"
+    assert os.listdir(tmp_path / "checkpoint.json.chunks") == ["000000.json"]
+    assert s3.load(ALBUM)["embeddings"][album[0]]["model"] == OLD  # Nothing swapped in yet
+
+    indexer = FakeIndexer()
+    status = run(make_reindexer(s3, tmp_path, indexer))
+
+    # The first chunk's photos came from its file and were not recomputed
+    assert indexer.calls == [album[2:4], album[4:]]
+    assert {r["model"] for r in s3.load(ALBUM)["embeddings"].values()} == {NEW}
+    assert status["error"] is None and status["albums_done"] == 1
+
+
+def test_swap_keeps_photos_added_and_removed_meanwhile(s3, tmp_path, album):
+    def concurrent_upload_and_delete(call_number):
+        if call_number == 1:
+            index = s3.load(ALBUM)
+            del index["embeddings"][album[4]]
+            index["embeddings"]["alice/wedding/new.jpg"] = record(NEW, 0.5)
+            s3.store(ALBUM, index)
+
+    run(make_reindexer(s3, tmp_path, FakeIndexer(on_call=concurrent_upload_and_delete)))
+
+    embeddings = s3.load(ALBUM)["embeddings"]
+    assert sorted(embeddings) == sorted(album[:4] + ["alice/wedding/new.jpg"])
+    assert embeddings["alice/wedding/new.jpg"]["embedding"] == [0.5, 1.0]
+    assert s3.load(ALBUM)["clusters"] == []
+
+
+def test_photos_that_keep_failing_are_dropped(s3, tmp_path, album):
+    indexer = FakeIndexer(fail_on=[album[1]])
+    status = run(make_reindexer(s3, tmp_path, indexer))
+
+    assert indexer.calls[-1] == [album[1]]  # Retried once
+    assert sorted(s3.load(ALBUM)["embeddings"]) == sorted(album[:1] + album[2:])
+    assert status["photos_dropped"] == 1
+
+
+def test_status_is_visible_to_other_workers(s3, tmp_path, album):
+    run(make_reindexer(s3, tmp_path, FakeIndexer()))
+
+    other_worker = make_reindexer(s3, tmp_path, FakeIndexer())
+    status = other_worker.status()
+
+    assert status["albums_done"] == 1 and status["photos_reindexed"] == 5
+    assert status["running"] is False
@@ -697,14 +697,15 @@ document.addEventListener('DOMContentLoaded', async () => {
                 successfulUrls.forEach(url => payload.append('urls', url));
                 payload.append('embedding_file', embedding_filename);
                 
-                const mlResponse = await fetch(`${ML_API_BASE_URL}/add_embeddings_from_urls/`, {
+                const mlResponse = await fetch(`${API_BASE_URL}/api/albums/${encodeURIComponent(albumId)}/index`, {
                     method: 'POST',
+                    headers: { 'Authorization': `Bearer ${token}` },
                     body: payload,
                 });
 
                 if (!mlResponse.ok) {
                     const mlError = await mlResponse.json();
-                    throw new Error(mlError.detail || "Face processing failed on the ML server.");
+                    throw new Error(mlError.detail || mlError.error || "Face processing failed on the ML server.");
                 }
                 
                 showToast("Face processing complete!", "success");
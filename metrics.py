@@ -0,0 +1,100 @@
+# metrics.py
+import time
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+
+# --- Metric Definitions ---
+REQUEST_LATENCY = Histogram(
+    "gateway_request_seconds",
+    "Time spent handling gateway HTTP requests",
+    ["method", "endpoint", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "gateway_requests_in_flight",
+    "Gateway HTTP requests currently being handled",
+)
+R2_LATENCY = Histogram(
+    "gateway_r2_request_seconds",
+    "Latency of Cloudflare R2 calls made by the gateway",
+    ["operation"],
+)
+ML_API_LATENCY = Histogram(
+    "gateway_ml_api_request_seconds",
+    "Latency of calls from the gateway to the ML API",
+    ["endpoint"],
+)
+RATE_LIMITED = Counter(
+    "gateway_rate_limited_total",
+    "Requests rejected by rate limiting or load shedding",
+    ["scope"],
+)
+ML_CALLS_IN_FLIGHT = Gauge(
+    "gateway_ml_calls_in_flight",
+    "Face search calls currently running on the ML API",
+)
+ML_CALLS_QUEUED = Gauge(
+    "gateway_ml_calls_queued",
+    "Face search calls waiting for a free ML API slot",
+)
+
+# Header a client sends to get the per-stage breakdown back in `Server-Timing`
+TIMING_REQUEST_HEADER = "X-Request-Timing"
+
+# Per-request list of (stage, seconds); None outside of a request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timing():
+    """Begin collecting a stage breakdown for the current request."""
+    _request_timings.set([])
+
+
+def get_request_timings():
+    """Return the (stage, seconds) pairs recorded for the current request."""
+    return list(_request_timings.get() or [])
+
+
+def record_stage(stage, seconds):
+    """Add a stage duration to the current request breakdown, if one is active."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(histogram, stage, **labels):
+    """Time a block, observe it on `histogram` and record it as `stage`.
+
+    Args:
+        histogram: Prometheus histogram to observe the duration on
+        stage: Name used for the stage in the request breakdown
+        labels: Label values for the histogram
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        record_stage(stage, elapsed)
+
+
+def format_server_timing(timings):
+    """Format (stage, seconds) pairs as a `Server-Timing` header value.
+
+    Repeated stages (e.g. several R2 calls) are summed and counted.
+    """
+    totals = {}
+    for stage, seconds in timings:
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + 1)
+    return ", ".join(
+        f'{stage};dur={total * 1000:.1f};desc="x{count}"'
+        for stage, (total, count) in totals.items()
+    )
+
+
+def render_metrics():
+    """Return (body, content_type) for a Prometheus scrape."""
+    return generate_latest(), CONTENT_TYPE_LATEST
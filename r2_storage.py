@@ -1,41 +1,71 @@
 # r2_storage.py
-import boto3
 import os
+from aiobotocore.session import get_session
 from config import R2_CONFIG
+from metrics import timed, R2_LATENCY
 
-# Initialize S3 client for Cloudflare R2
-s3 = boto3.client(
-    "s3",
-    endpoint_url=R2_CONFIG["endpoint_url"],
-    aws_access_key_id=R2_CONFIG["aws_access_key_id"],
-    aws_secret_access_key=R2_CONFIG["aws_secret_access_key"],
-)
+# Async S3 client for Cloudflare R2, opened by init_client() at app startup
+_session = get_session()
+_client_context = None
+s3 = None
 
-def upload_to_r2(local_file_path, r2_object_path):
+async def init_client():
+    """Open the shared R2 client. Call once when the app starts."""
+    global _client_context, s3
+    _client_context = _session.create_client(
+        "s3",
+        endpoint_url=R2_CONFIG["endpoint_url"],
+        aws_access_key_id=R2_CONFIG["aws_access_key_id"],
+        aws_secret_access_key=R2_CONFIG["aws_secret_access_key"],
+    )
+    s3 = await _client_context.__aenter__()
+
+async def close_client():
+    """Close the shared R2 client. Call once when the app shuts down."""
+    global _client_context, s3
+    if _client_context is not None:
+        await _client_context.__aexit__(None, None, None)
+    _client_context, s3 = None, None
+
+async def upload_to_r2(local_file_path, r2_object_path):
     """Upload a local file to Cloudflare R2 storage
-    
+
     Args:
         local_file_path: Local path to the file
         r2_object_path: Path/key for the object in R2
-        
+
     Returns:
         Tuple (success, url)
     """
     try:
-        # Get file content type based on extension
-        content_type = get_content_type(local_file_path)
-        
-        # Upload file with appropriate content-type
-        s3.upload_file(
-            local_file_path, 
-            R2_CONFIG["bucket_name"], 
-            r2_object_path,
-            ExtraArgs={
-                'ContentType': content_type,
-                'ACL': 'public-read'  # Make the file publicly accessible
-            }
-        )
-        
+        with open(local_file_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"Error reading {local_file_path} for upload: {e}")
+        return False, None
+    return await upload_bytes_to_r2(data, r2_object_path, get_content_type(local_file_path))
+
+async def upload_bytes_to_r2(data, r2_object_path, content_type=None):
+    """Upload in-memory bytes to Cloudflare R2 storage
+
+    Args:
+        data: Bytes to store
+        r2_object_path: Path/key for the object in R2
+        content_type: MIME type; derived from the key's extension if omitted
+
+    Returns:
+        Tuple (success, url)
+    """
+    try:
+        with timed(R2_LATENCY, "r2_upload", operation="upload"):
+            await s3.put_object(
+                Bucket=R2_CONFIG["bucket_name"],
+                Key=r2_object_path,
+                Body=data,
+                ContentType=content_type or get_content_type(r2_object_path),
+                ACL='public-read'  # Make the file publicly accessible
+            )
+
         # Return the public URL
         url = f"{R2_CONFIG['public_base_url']}/{r2_object_path}"
         return True, url
@@ -43,59 +73,100 @@ def upload_to_r2(local_file_path, r2_object_path):
         print(f"Error uploading to R2: {e}")
         return False, None
 
-def list_objects(prefix="", delimiter="", limit=1000):
+async def list_objects(prefix="", delimiter="", limit=1000):
     """List objects in the R2 bucket
-    
+
     Args:
         prefix: Prefix filter for objects
         delimiter: Delimiter for hierarchical listing
         limit: Maximum number of objects to return
-        
+
     Returns:
         List of object keys
     """
     try:
         if delimiter:
-            response = s3.list_objects_v2(
-                Bucket=R2_CONFIG["bucket_name"],
-                Prefix=prefix,
-                Delimiter=delimiter,
-                MaxKeys=limit
-            )
-            
+            with timed(R2_LATENCY, "r2_list", operation="list"):
+                response = await s3.list_objects_v2(
+                    Bucket=R2_CONFIG["bucket_name"],
+                    Prefix=prefix,
+                    Delimiter=delimiter,
+                    MaxKeys=limit
+                )
+
             # Include both objects and common prefixes (folders)
             result = []
-            
+
             # Add regular objects
             if 'Contents' in response:
                 result.extend([item['Key'] for item in response['Contents']])
-            
+
             # Add folders
             if 'CommonPrefixes' in response:
                 result.extend([item['Prefix'] for item in response['CommonPrefixes']])
-                
+
             return result
         else:
-            response = s3.list_objects_v2(
-                Bucket=R2_CONFIG["bucket_name"],
-                Prefix=prefix,
-                MaxKeys=limit
-            )
-            
+            with timed(R2_LATENCY, "r2_list", operation="list"):
+                response = await s3.list_objects_v2(
+                    Bucket=R2_CONFIG["bucket_name"],
+                    Prefix=prefix,
+                    MaxKeys=limit
+                )
+
             if 'Contents' not in response:
                 return []
-                
+
             return [item['Key'] for item in response['Contents']]
     except Exception as e:
         print(f"Error listing objects in R2: {e}")
         return []
 
+async def list_object_details(prefix=""):
+    """List every object under a prefix with its size, following pagination
+
+    Args:
+        prefix: Prefix filter for objects
+
+    Returns:
+        List of dicts with 'key' and 'size' (bytes)
+    """
+    details = []
+    try:
+        paginator = s3.get_paginator('list_objects_v2')
+        with timed(R2_LATENCY, "r2_list", operation="list"):
+            async for page in paginator.paginate(Bucket=R2_CONFIG["bucket_name"], Prefix=prefix):
+                details.extend({'key': item['Key'], 'size': item['Size']} for item in page.get('Contents', []))
+        return details
+    except Exception as e:
+        print(f"Error listing objects in R2: {e}")
+        return []
+
+async def get_object_bytes(object_key):
+    """Download an object from R2
+
+    Args:
+        object_key: The key of the object in R2
+
+    Returns:
+        The object's bytes, or None if it does not exist or cannot be read
+    """
+    try:
+        with timed(R2_LATENCY, "r2_get", operation="get"):
+            response = await s3.get_object(Bucket=R2_CONFIG["bucket_name"], Key=object_key)
+            async with response['Body'] as stream:
+                return await stream.read()
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') not in ('404', 'NoSuchKey'):
+            print(f"Error downloading {object_key} from R2: {e}")
+        return None
+
 def get_object_url(object_key):
     """Get the public URL for an R2 object
-    
+
     Args:
         object_key: The key of the object in R2
-        
+
     Returns:
         Public URL of the object
     """
@@ -104,7 +175,7 @@ def get_object_url(object_key):
 def get_content_type(file_path):
     """Determine the content type based on file extension"""
     extension = os.path.splitext(file_path)[1].lower()
-    
+
     # Map common extensions to content types
     content_types = {
         '.jpg': 'image/jpeg',
@@ -116,27 +187,28 @@ def get_content_type(file_path):
         '.pdf': 'application/pdf',
         '.txt': 'text/plain',
     }
-    
+
     return content_types.get(extension, 'application/octet-stream')
 
-def delete_from_r2(r2_object_key):
+async def delete_from_r2(r2_object_key):
     """Delete an object from Cloudflare R2 storage
-    
+
     Args:
         r2_object_key: The key of the object in R2 to delete.
-        
+
     Returns:
         Tuple (success: bool, error_message: str or None)
     """
     try:
         print(f"R2_STORAGE: Attempting to delete object: {r2_object_key}")
-        s3.delete_object(
-            Bucket=R2_CONFIG["bucket_name"],
-            Key=r2_object_key
-        )
+        with timed(R2_LATENCY, "r2_delete", operation="delete"):
+            await s3.delete_object(
+                Bucket=R2_CONFIG["bucket_name"],
+                Key=r2_object_key
+            )
         print(f"R2_STORAGE: Successfully initiated delete for {r2_object_key}")
         return True, None
     except Exception as e:
         error_msg = f"Error deleting {r2_object_key} from R2: {e}"
         print(error_msg)
-        return False, error_msg
\ No newline at end of file
+        return False, error_msg
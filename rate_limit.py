@@ -0,0 +1,137 @@
+# rate_limit.py
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from metrics import RATE_LIMITED, ML_CALLS_IN_FLIGHT, ML_CALLS_QUEUED
+
+
+class RateLimited(Exception):
+    """Raised when a caller has used up its request budget."""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"Rate limit exceeded for {scope}, retry in {retry_after:.0f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """Raised when too many requests are already waiting for the ML API."""
+
+    def __init__(self, retry_after):
+        super().__init__("Face search is busy, please retry shortly")
+        self.retry_after = retry_after
+
+
+# --- Token Bucket Backends ---
+class RateLimitBackend(ABC):
+    """Storage for token buckets.
+
+    The in-process backend only limits a single gateway process. To share
+    limits between processes or hosts, subclass this with a store such as
+    Redis (e.g. a Lua script doing the same refill-and-take atomically) and
+    pass it to configure().
+    """
+
+    @abstractmethod
+    def consume(self, key, rate, burst, cost=1):
+        """Take `cost` tokens from the bucket `key`.
+
+        Args:
+            key: Bucket identifier
+            rate: Tokens added per second
+            burst: Bucket capacity
+            cost: Tokens this request needs
+
+        Returns:
+            Tuple (allowed, retry_after_seconds)
+        """
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Token buckets held in this process."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # {key: (tokens, last_refill, rate, burst)}
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now, rate, burst)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now, rate, burst)
+                allowed, retry_after = False, (cost - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        """Forget buckets that have refilled completely; they behave like new ones."""
+        for key in [k for k, (tokens, last, rate, burst) in self._buckets.items()
+                    if tokens + (now - last) * rate >= burst]:
+            del self._buckets[key]
+
+
+_backend = InMemoryBackend()
+
+
+def configure(backend):
+    """Use `backend` for all rate limits, e.g. a shared-store implementation."""
+    global _backend
+    _backend = backend
+
+
+def check_rate_limit(scope, key, rate, burst):
+    """Take one request from the bucket for `key`, raising RateLimited if empty."""
+    allowed, retry_after = _backend.consume(f"{scope}:{key}", rate, burst)
+    if not allowed:
+        RATE_LIMITED.labels(scope=scope).inc()
+        raise RateLimited(scope, retry_after)
+
+
+# --- Concurrency Limiting ---
+class ConcurrencyLimiter:
+    """Caps in-flight calls to a backend and sheds requests when the queue is deep.
+
+    Requests beyond `max_in_flight` wait in line; once `max_queue` are already
+    waiting, or a request has waited `queue_timeout` seconds, it is rejected
+    with Overloaded so admitted requests keep a bounded latency.
+    """
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            RATE_LIMITED.labels(scope="ml_queue").inc()
+            raise Overloaded(self.queue_timeout)
+
+        self.waiting += 1
+        ML_CALLS_QUEUED.inc()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            RATE_LIMITED.labels(scope="ml_queue").inc()
+            raise Overloaded(self.queue_timeout)
+        finally:
+            self.waiting -= 1
+            ML_CALLS_QUEUED.dec()
+
+        ML_CALLS_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            ML_CALLS_IN_FLIGHT.dec()
+            self._semaphore.release()
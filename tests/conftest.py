@@ -0,0 +1,7 @@
+# conftest.py
+# Gateway tests import the top-level modules; the ML service has its own
+# tests under docker/tests.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,130 @@
+# test_album_summary.py
+import io
+import json
+import asyncio
+import datetime
+
+import pytest
+from PIL import Image
+
+import album_summary
+from album_summary import get_summary, refresh_summary, SUMMARY_NAME
+
+PREFIX = "alice/wedding/"
+
+
+def jpeg():
+    output = io.BytesIO()
+    Image.new('RGB', (32, 24)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+class FakeR2:
+    """In-memory stand-in for the r2_storage helpers album_summary uses."""
+
+    def __init__(self):
+        self.objects = {}
+        self.listings = 0
+
+    async def list_object_details(self, prefix):
+        self.listings += 1
+        return [{"key": key, "size": len(data)} for key, data in self.objects.items() if key.startswith(prefix)]
+
+    async def get_object_bytes(self, key):
+        return self.objects.get(key)
+
+    async def upload_bytes_to_r2(self, data, key, content_type=None):
+        self.objects[key] = data
+        return True, key
+
+    async def delete_from_r2(self, key):
+        self.objects.pop(key, None)
+        return True, None
+
+    def summary(self):
+        return json.loads(self.objects[PREFIX + SUMMARY_NAME])
+
+    def thumbnails(self):
+        return [key for key in self.objects if key.startswith(PREFIX + album_summary.THUMBNAIL_PREFIX)]
+
+
+@pytest.fixture
+def r2(monkeypatch):
+    fake = FakeR2()
+    for name in ("list_object_details", "get_object_bytes", "upload_bytes_to_r2", "delete_from_r2"):
+        monkeypatch.setattr(album_summary, name, getattr(fake, name))
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        fake.objects[PREFIX + name] = jpeg()
+    return fake
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def faces(**confidences):
+    return [{"key": f"{PREFIX}{name}.jpg", "confidence": confidence} for name, confidence in confidences.items()]
+
+
+def test_cover_is_most_confident_face(r2):
+    run(refresh_summary("alice", "wedding", faces(b=0.9, c=0.99)))
+
+    summary = r2.summary()
+    assert summary["photo_count"] == 3
+    assert summary["cover_key"] == PREFIX + "c.jpg" and summary["cover_confidence"] == 0.99
+    assert r2.thumbnails() == [summary["cover_thumbnail_key"]]
+
+
+def test_deleted_cover_falls_back_to_next_most_confident_face(r2):
+    run(refresh_summary("alice", "wedding", faces(b=0.9, c=0.99)))
+
+    del r2.objects[PREFIX + "c.jpg"]
+    run(refresh_summary("alice", "wedding"))
+
+    summary = r2.summary()
+    assert summary["photo_count"] == 2
+    assert summary["cover_key"] == PREFIX + "b.jpg" and summary["cover_confidence"] == 0.9
+    assert r2.thumbnails() == [summary["cover_thumbnail_key"]]
+
+
+def test_album_without_faces_keeps_its_cover(r2):
+    run(refresh_summary("alice", "wedding"))
+    cover = r2.summary()["cover_key"]
+    r2.objects[PREFIX + "0.jpg"] = jpeg()  # Sorts first, but the cover still exists
+
+    run(refresh_summary("alice", "wedding"))
+
+    assert r2.summary()["cover_key"] == cover
+
+
+def test_emptied_album_drops_its_thumbnail(r2):
+    run(refresh_summary("alice", "wedding", faces(a=0.8)))
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        del r2.objects[PREFIX + name]
+
+    run(refresh_summary("alice", "wedding"))
+
+    summary = r2.summary()
+    assert summary["photo_count"] == 0 and summary["cover_key"] is None
+    assert r2.thumbnails() == []
+
+
+def test_fresh_summary_is_served_without_listing(r2):
+    run(refresh_summary("alice", "wedding"))
+    r2.listings = 0
+    r2.objects[PREFIX + "d.jpg"] = jpeg()
+
+    assert run(get_summary("alice", "wedding"))["photo_count"] == 3
+    assert r2.listings == 0
+
+
+def test_stale_summary_is_recomputed(r2, monkeypatch):
+    run(refresh_summary("alice", "wedding", faces(b=0.9)))
+    r2.objects[PREFIX + "d.jpg"] = jpeg()  # Uploaded without a refresh
+    monkeypatch.setattr(album_summary, "SUMMARY_MAX_AGE", datetime.timedelta(seconds=-1))
+
+    summary = run(get_summary("alice", "wedding"))
+
+    assert summary["photo_count"] == 4
+    assert summary["cover_key"] == PREFIX + "b.jpg"  # Candidates carry over
+    assert r2.summary()["photo_count"] == 4
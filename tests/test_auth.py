@@ -0,0 +1,89 @@
+# test_auth.py
+import jwt
+import pytest
+
+import auth
+from auth import create_token, verify_token, revoke_token, InMemoryRevocationStore
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(auth, "_revocations", InMemoryRevocationStore())
+    auth._token_cache.clear()
+    yield
+    auth._token_cache.clear()
+
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """Count full signature checks made by verify_token."""
+    calls = []
+    real_decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    return calls
+
+
+def test_repeat_verification_is_served_from_cache(decode_calls):
+    token = create_token("alice")
+    assert verify_token(token)['sub'] == "alice"
+    assert verify_token(token)['sub'] == "alice"
+    assert len(decode_calls) == 1
+
+
+def test_cached_claims_expire_at_exp(monkeypatch, decode_calls):
+    token = create_token("alice", expires_in=60)
+    exp = verify_token(token)['exp']
+
+    monkeypatch.setattr(auth.time, "time", lambda: exp + 1)
+    verify_token(token)
+
+    # The cached entry is not trusted past exp; the token is checked in full again
+    assert len(decode_calls) == 2
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verify_token(create_token("alice", expires_in=-10))
+
+
+def test_cache_is_bounded_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_CACHE_SIZE", 2)
+    first, second, third = (create_token(name) for name in ("a", "b", "c"))
+    verify_token(first)
+    verify_token(second)
+    verify_token(first)  # Now the most recently used
+    verify_token(third)
+
+    assert list(auth._token_cache) == [first, third]
+
+
+def test_revocation_rejects_cached_token():
+    token = create_token("alice")
+    claims = verify_token(token)
+
+    revoke_token(claims)
+
+    assert token not in auth._token_cache
+    with pytest.raises(jwt.InvalidTokenError):
+        verify_token(token)
+
+
+def test_revocation_rejects_token_never_seen_by_this_process():
+    token = create_token("alice")
+    claims = jwt.decode(token, auth.JWT_SECRET, algorithms=['HS256'])
+
+    revoke_token(claims)
+
+    with pytest.raises(jwt.InvalidTokenError):
+        verify_token(token)
+
+
+def test_revocation_does_not_affect_other_tokens():
+    revoked, other = create_token("alice"), create_token("alice")
+    revoke_token(verify_token(revoked))
+    assert verify_token(other)['sub'] == "alice"
@@ -0,0 +1,155 @@
+# test_rate_limit.py
+import asyncio
+
+import pytest
+
+import rate_limit
+from rate_limit import InMemoryBackend, ConcurrencyLimiter, RateLimitBackend, RateLimited, Overloaded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake)
+    return fake
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+
+def test_burst_then_reject_with_retry_after(clock):
+    backend = InMemoryBackend()
+    assert all(backend.consume("k", rate=0.5, burst=3)[0] for _ in range(3))
+
+    allowed, retry_after = backend.consume("k", rate=0.5, burst=3)
+
+    assert not allowed
+    assert retry_after == pytest.approx(2.0)  # One token at 0.5 tokens/s
+
+
+def test_bucket_refills_over_time_up_to_burst(clock):
+    backend = InMemoryBackend()
+    for _ in range(3):
+        backend.consume("k", rate=0.5, burst=3)
+
+    clock.now += 1.0
+    allowed, retry_after = backend.consume("k", rate=0.5, burst=3)
+    assert not allowed and retry_after == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert backend.consume("k", rate=0.5, burst=3) == (True, 0.0)
+
+    clock.now += 3600
+    assert [backend.consume("k", rate=0.5, burst=3)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_independent(clock):
+    backend = InMemoryBackend()
+    backend.consume("a", rate=1, burst=1)
+    assert not backend.consume("a", rate=1, burst=1)[0]
+    assert backend.consume("b", rate=1, burst=1)[0]
+
+
+def test_full_buckets_are_pruned(clock):
+    backend = InMemoryBackend(max_keys=2)
+    backend.consume("a", rate=1, burst=5)
+    backend.consume("b", rate=1, burst=5)
+    clock.now += 10
+    backend.consume("c", rate=1, burst=5)
+    assert list(backend._buckets) == ["c"]
+
+
+def test_check_rate_limit_raises(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, "_backend", InMemoryBackend())
+    rate_limit.check_rate_limit("token", "t1", 1, 1)
+    with pytest.raises(RateLimited) as excinfo:
+        rate_limit.check_rate_limit("token", "t1", 1, 1)
+    assert excinfo.value.scope == "token"
+    assert excinfo.value.retry_after == pytest.approx(1.0)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def hold(limiter, release):
+    async with limiter.slot():
+        await release.wait()
+
+
+async def settle():
+    """Let started tasks reach their slot or their place in the queue."""
+    await asyncio.sleep(0.01)
+
+
+def test_limiter_sheds_when_queue_is_full():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(limiter, release))
+        waiter = asyncio.ensure_future(hold(limiter, release))
+        await settle()
+
+        try:
+            assert limiter.waiting == 1
+            with pytest.raises(Overloaded):
+                async with limiter.slot():
+                    pass
+        finally:
+            release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.waiting == 0
+
+    run(scenario())
+
+
+def test_limiter_times_out_queued_requests():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=5, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(limiter, release))
+        await settle()
+
+        try:
+            with pytest.raises(Overloaded) as excinfo:
+                async with limiter.slot():
+                    pass
+            assert excinfo.value.retry_after == 0.05
+            assert limiter.waiting == 0
+        finally:
+            release.set()
+        await holder
+        # The slot is free again once the holder is done
+        async with limiter.slot():
+            pass
+
+    run(scenario())
+
+
+def test_limiter_admits_up_to_max_in_flight():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_in_flight=2, max_queue=0, queue_timeout=5)
+        release = asyncio.Event()
+        holders = [asyncio.ensure_future(hold(limiter, release)) for _ in range(2)]
+        await settle()
+        assert limiter.waiting == 0
+
+        try:
+            with pytest.raises(Overloaded):
+                async with limiter.slot():
+                    pass
+        finally:
+            release.set()
+        await asyncio.gather(*holders)
+
+    run(scenario())